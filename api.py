@@ -47,12 +47,7 @@ class SlackOauth(HTTPMethodView):
             })
 
         # create task
-        db.tasks.insert_one({
-            'function': 'update_slack_team',
-            'kwargs': {
-                'team_id': team_id
-            }
-        })
+        db.add_task('update_slack_team', team_id=team_id)
 
         return redirect(f'https://app.slack.com/client/{team_id}')
 
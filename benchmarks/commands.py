@@ -0,0 +1,151 @@
+"""
+Measures how many commands per second can be dispatched through the clearance checks of `TLDR.process_command`.
+
+Compares the old way of rebuilding the full command name, copying the command, building its help and working out
+clearance by iterating over the member's roles and the spreadsheet lists on every invocation against
+:func:`modules.commands.resolve_sub_command`, :func:`modules.commands.Command.clearance_copy` and the memoized bitmask checks.
+Commands are created without loading their data from the database.
+
+Usage: python -m benchmarks.commands [dispatch count]
+"""
+import copy
+import sys
+import time
+
+from types import SimpleNamespace
+from discord.ext.commands import GroupMixin
+from discord.ext.commands.view import StringView
+from modules import commands
+
+MESSAGES = ['>rank', '>ranks', '>ranks add pp 5 Member', '>ranks list hp', '>rank @user some words']
+
+
+def make_commands():
+    commands.Command.initialize_command_data = lambda self: setattr(self, 'data', {'disabled': False})
+
+    clearance = commands.Clearance.__new__(commands.Clearance)
+    clearance.roles = {'Member': 1, 'Mod': 2, 'Admin': 3, 'Dev': 4}
+    clearance.groups = {'Staff': ['Mod', 'Admin'], 'Developers': ['Dev']}
+    clearance.command_access = {
+        'rank': {'groups': [], 'roles': ['User'], 'users': []},
+        'ranks': {'groups': ['Staff'], 'roles': [], 'users': []},
+    }
+    clearance.member_clearances = {}
+
+    async def callback(ctx):
+        pass
+
+    rank = commands.Command(callback, name='rank', help='Rank', usage='rank', examples=['rank'])
+    ranks = commands.Group(callback, name='ranks', help='Ranks', usage='ranks', Staff=commands.Help(help='Staff help'))
+    for name in ['add', 'remove', 'list']:
+        sub_command = commands.Command(callback, name=name, help=name)
+        ranks.add_command(sub_command)
+        clearance.command_access[sub_command.full_name] = clearance.command_access['ranks']
+
+    clearance.compile_clearance()
+
+    bot = GroupMixin()
+    bot.clearance = clearance
+    for command in [rank, ranks, *ranks.commands]:
+        command.bot = bot
+    bot.add_command(rank)
+    bot.add_command(ranks)
+
+    return bot
+
+
+def old_member_clearance(clearance, member):
+    member_clearance = {'groups': [], 'roles': ['User'], 'user_id': member.id}
+    member_role_ids = [role.id for role in member.roles]
+
+    for role_name, role_id in clearance.roles.items():
+        if role_id in member_role_ids:
+            member_clearance['roles'].append(role_name)
+
+            for group_name, roles in clearance.groups.items():
+                if role_name in roles and group_name not in member_clearance['groups']:
+                    member_clearance['groups'].append(group_name)
+
+    return member_clearance
+
+
+def old_can_use(command, member):
+    command_clearance = command.bot.clearance.command_access[command.full_name]
+    member_clearance = old_member_clearance(command.bot.clearance, member)
+    return (
+        member_clearance['user_id'] in command_clearance['users']
+        or set(command_clearance['roles']) & set(member_clearance['roles'])
+        or set(command_clearance['groups']) & set(member_clearance['groups'])
+    )
+
+
+def old_get_help(command, member):
+    help_object = copy.copy(command.docs)
+    member_clearance = old_member_clearance(command.bot.clearance, member)
+    if command.special_help_group and command.special_help_group in member_clearance['groups']:
+        help_object = command.__original_kwargs__[command.special_help_group]
+        help_object.clearance = command.special_help_group
+    else:
+        help_object.clearance = command.bot.clearance.highest_member_clearance(member_clearance)
+
+    return help_object
+
+
+def old_dispatch(bot, ctx):
+    view = copy.copy(ctx.view)
+    full_command_name = ctx.command.name
+    view.skip_ws()
+    while True:
+        add = view.get_word()
+        if not add:
+            break
+        full_command_name += f' {add}'
+
+    command = bot.get_command(full_command_name)
+    ctx.command = copy.copy(ctx.command)
+    ctx.command.docs = old_get_help(ctx.command, ctx.author)
+    return old_can_use(ctx.command, ctx.author) and (command is None or old_can_use(command, ctx.author))
+
+
+def new_dispatch(_bot, ctx):
+    command = commands.resolve_sub_command(ctx.command, ctx.view)
+    ctx.command = ctx.command.clearance_copy(ctx.author)
+    return ctx.command.can_use(ctx.author) and (command is None or command.can_use(ctx.author))
+
+
+def make_context(bot, content: str, member):
+    view = StringView(content)
+    view.skip_string('>')
+    command = bot.all_commands[view.get_word()]
+    return SimpleNamespace(view=view, command=command, author=member)
+
+
+def run(name: str, dispatch, bot, contexts: list):
+    start = time.perf_counter()
+    allowed = 0
+    for ctx in contexts:
+        allowed += bool(dispatch(bot, ctx))
+    elapsed = time.perf_counter() - start
+    print(f'{name:>5}: {len(contexts) / elapsed:>12,.0f} dispatches/s ({allowed} allowed)')
+
+
+def main():
+    dispatch_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    bot = make_commands()
+    guild = SimpleNamespace(id=0)
+    members = [
+        SimpleNamespace(id=i, guild=guild, roles=[SimpleNamespace(id=role_id) for role_id in roles])
+        for i, roles in enumerate([[], [1], [1, 2], [1, 3, 4]])
+    ]
+
+    for name, dispatch in [('old', old_dispatch), ('new', new_dispatch)]:
+        contexts = [
+            make_context(bot, MESSAGES[i % len(MESSAGES)], members[i % len(members)])
+            for i in range(dispatch_count)
+        ]
+        run(name, dispatch, bot, contexts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures how many messages per second can be matched against a guild's custom commands.
+
+Compares the old way of running `re.findall` with every command name against :class:`CustomCommandMatcher`.
+
+Usage: python -m benchmarks.custom_commands [command count] [message count]
+"""
+import re
+import sys
+import random
+import string
+import time
+
+from modules.custom_commands import CustomCommandMatcher
+
+
+def random_word(length: int = 8) -> str:
+    return ''.join(random.choices(string.ascii_lowercase, k=length))
+
+
+def make_commands(count: int) -> list:
+    commands = []
+    for i in range(count):
+        word = random_word()
+        # mix of literal names and names using regex, like the ones created with `customcommands add`
+        if i % 3 == 0:
+            name = f'^{word}:(.*)'
+        elif i % 3 == 1:
+            name = f'{word}\\s+(\\w+)'
+        else:
+            name = f'!{word}'
+        commands.append({'name': name, 'response': word})
+
+    return commands
+
+
+def make_messages(count: int, commands: list) -> list:
+    messages = []
+    for i in range(count):
+        # most messages in a guild aren't custom commands
+        if i % 20 == 0:
+            command = random.choice(commands)
+            messages.append(command['name'].replace('^', '').replace('\\s+', ' ').replace('(\\w+)', 'word').replace('(.*)', ' text'))
+        else:
+            messages.append(' '.join(random_word(random.randint(2, 9)) for _ in range(random.randint(3, 30))))
+
+    return messages
+
+
+def findall_match(commands: list, content: str):
+    for cc in commands:
+        if re.findall(cc['name'], content):
+            return cc
+
+
+def run(name: str, func, messages: list):
+    start = time.perf_counter()
+    matched = sum(1 for content in messages if func(content) is not None)
+    elapsed = time.perf_counter() - start
+    print(f'{name:>10}: {len(messages) / elapsed:>12,.0f} matches/s ({matched} matched)')
+
+
+def main():
+    command_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    random.seed(0)
+    commands = make_commands(command_count)
+    messages = make_messages(message_count, commands)
+
+    start = time.perf_counter()
+    matcher = CustomCommandMatcher(commands)
+    print(f'{command_count} commands, {message_count} messages, matcher built in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+    run('findall', lambda content: findall_match(commands, content), messages)
+    run('matcher', matcher.match, messages)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures how fast @mentions in discord messages can be resolved to members of a slack workspace.
+
+Runs :func:`modules.slack_bridge.DiscordMessage.replace_custom_mentions` with the old way of matching an escaped regex
+against every member name for each word of a mention and with :class:`modules.slack_bridge.MemberNameIndex`.
+
+Usage: python -m benchmarks.slack_mentions [member count] [message count]
+"""
+import re
+import sys
+import random
+import string
+import time
+
+from types import SimpleNamespace
+from modules.slack_bridge import DiscordMessage, MemberNameIndex, SlackMember
+
+special_chars_map = {i: '\\' + chr(i) for i in b'()[]{}?*+-|^$\\.&~#'}
+
+
+class RegexMemberNames:
+    """The old way of finding members, matching an escaped regex against every member name."""
+    def __init__(self, members: list):
+        self.members = members
+
+    def find(self, text: str, *, limit: int = None) -> list[str]:
+        safe_text = text.translate(special_chars_map)
+        return [m.id for m in self.members if re.findall(fr'({safe_text.lower()})', m.name.lower())][:limit]
+
+
+def random_name() -> str:
+    first = ''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 8))).capitalize()
+    last = ''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 10))).capitalize()
+    return f'{first} {last}'
+
+
+def make_member(slack_id: str, name: str) -> SlackMember:
+    # set through __dict__, so the member isn't initialised from the database or indexed into a team
+    member = SlackMember.__new__(SlackMember)
+    member.__dict__.update(id=slack_id, name=name)
+    return member
+
+
+def make_message(member_ids: dict, member_names) -> DiscordMessage:
+    """DiscordMessage in a channel bridged to a team with the given members and name index."""
+    team = SimpleNamespace(member_ids=member_ids, member_names=member_names)
+    slack = SimpleNamespace(get_channel=lambda slack_id=None, *, discord_id=None: SimpleNamespace(team=team))
+    message = DiscordMessage.__new__(DiscordMessage)
+    message.__dict__.update(slack=slack, channel_id=0)
+    return message
+
+
+def main():
+    member_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    random.seed(0)
+    members = [make_member(f'U{i:08}', random_name()) for i in range(member_count)]
+    member_ids = {member.id: member for member in members}
+
+    start = time.perf_counter()
+    index = MemberNameIndex()
+    for member in members:
+        index.add(member.id, member.name)
+    print(f'{member_count} members, index built in {(time.perf_counter() - start) * 1000:.0f}ms')
+
+    messages = []
+    for _ in range(message_count):
+        member = random.choice(members)
+        messages.append(f'hey @{member.name} what do you think about this')
+
+    results = {}
+    for name, member_names in [('regex', RegexMemberNames(members)), ('index', index)]:
+        discord_message = make_message(member_ids, member_names)
+        start = time.perf_counter()
+        results[name] = [discord_message.replace_custom_mentions(message) for message in messages]
+        elapsed = time.perf_counter() - start
+        print(f'{name:>5}: {message_count / elapsed:>10,.1f} messages/s')
+
+    print(f'same results: {results["regex"] == results["index"]}')
+
+
+if __name__ == '__main__':
+    main()
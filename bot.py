@@ -1,5 +1,4 @@
 import asyncio
-import copy
 import os
 import traceback
 from datetime import datetime
@@ -9,6 +8,7 @@ from discord.ext.commands import Bot, when_mentioned_or
 from twtsc import Twtsc
 
 import config
+import modules.anon_polls
 import modules.captcha_verification
 import modules.commands
 import modules.custom_commands
@@ -80,6 +80,10 @@ class TLDR(Bot):
         self.timers = (
             modules.timers.Timers(self) if self.enabled_modules["timers"] else None
         )
+        # anonymous polls are run with timers
+        self.anon_polls = (
+            modules.anon_polls.AnonPolls(self) if self.enabled_modules["timers"] else None
+        )
         self.reaction_menus = (
             modules.reaction_menus.ReactionMenus(self)
             if self.enabled_modules["reaction_menus"]
@@ -131,6 +135,17 @@ class TLDR(Bot):
         )
         self.captcha = None  # Temporary.
 
+    async def close(self):
+        """Overwrites the original close method to write any buffered leveling updates and poll votes before shutting down."""
+        if self.leveling_system:
+            await self.leveling_system.write_buffer.flush()
+
+        if self.anon_polls:
+            await self.anon_polls.flush()
+
+        await modules.utils.close_file_download_session()
+        await super().close()
+
     def add_cog(self, cog):
         """Overwrites the orginal add_cog method to add a line for the commandSystem"""
         self.command_system.initialize_cog(cog)
@@ -245,7 +260,7 @@ class TLDR(Bot):
             return await self.process_command(message)
 
     async def check_custom_command(self, message: discord.Message):
-        custom_command = self.custom_commands.match_message(message)
+        custom_command = await self.custom_commands.match_message(message)
         if custom_command:
             # get ctx
             ctx = await self.get_context(message)
@@ -293,20 +308,10 @@ class TLDR(Bot):
         if self.clearance:
             # get the object of the command actually being run, so that can be checked instead of just the parent command
             # Discord.py invokes the parent command, then it looks for any sub commands and invokes those directly, instead of processing them like commands
-            view = copy.copy(ctx.view)
-            full_command_name = ctx.command.name
-            view.skip_ws()
-            while True:
-                add = view.get_word()
-                if not add:
-                    break
-                full_command_name += f" {add}"
-
-            command = self.get_command(full_command_name)
-
-            # create copy of original so values of original aren't modified
-            ctx.command = copy.copy(ctx.command)
-            ctx.command.docs = ctx.command.get_help(ctx.author)
+            command = modules.commands.resolve_sub_command(ctx.command, ctx.view)
+
+            # use a copy with help specified to the user's clearance, so values of original aren't modified
+            ctx.command = ctx.command.clearance_copy(ctx.author)
 
             # check if command has been disabled
             if ctx.command.disabled or (command and command.disabled):
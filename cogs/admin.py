@@ -827,6 +827,8 @@ class Admin(Cog):
         args['guild_id'] = ctx.guild.id
         # insert into database
         db.custom_commands.insert(args)
+        if self.bot.custom_commands:
+            self.bot.custom_commands.invalidate(ctx.guild.id)
 
         # convert args into string that can be presented to user who created the command
         attributes_str = self.custom_command_args_to_string(args)
@@ -880,6 +882,8 @@ class Admin(Cog):
         args = {key: value for key, value in args.items() if value and value != existing[key]}
         # insert into database
         db.custom_commands.update_one({'guild_id': ctx.guild.id, 'name': old_command_name}, {'$set': args})
+        if self.bot.custom_commands:
+            self.bot.custom_commands.invalidate(ctx.guild.id)
 
         # convert args into string that can be presented to user who created the command
         attributes_str = self.custom_command_args_to_string(args, old=existing)
@@ -913,6 +917,8 @@ class Admin(Cog):
             return await embed_maker.error(ctx, 'Invalid index')
 
         db.custom_commands.delete_one({'guild_id': ctx.guild.id, 'name': command['name']})
+        if self.bot.custom_commands:
+            self.bot.custom_commands.invalidate(ctx.guild.id)
 
         return await embed_maker.message(
             ctx,
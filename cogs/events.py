@@ -15,7 +15,7 @@ from modules import database, embed_maker, format_time
 from modules.captcha_verification import CaptchaChannel
 from modules.custom_commands import Guild, Message
 
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class Events(Cog):
@@ -45,15 +45,15 @@ class Events(Cog):
             bot.dispatch("new_insta_posts", posts, discord_channel)
 
         insta_listener = db.insta_listeners.find({})
-        for listener_data in insta_listener:
+        async for listener_data in insta_listener:
             discord_channel = self.bot.get_channel(listener_data["discord_channel_id"])
             if discord_channel is None:
-                db.tweet_listeners.delete_one(listener_data)
+                await db.tweet_listeners.delete_one(listener_data)
 
             insta_user_id = listener_data["insta_user_id"]
             insta_user = self.bot.instagram.get_user(user_id=insta_user_id)
             if insta_user is None:
-                db.tweet_listeners.delete_one(listener_data)
+                await db.tweet_listeners.delete_one(listener_data)
 
             partial_callback = partial(new_insta_posts, discord_channel=discord_channel)
             self.bot.instagram.create_listener(insta_user.identifier, partial_callback)
@@ -65,15 +65,15 @@ class Events(Cog):
             bot.dispatch("new_tweets", tweets, discord_channel)
 
         tweet_listeners = db.tweet_listeners.find({})
-        for listener_data in tweet_listeners:
+        async for listener_data in tweet_listeners:
             discord_channel = self.bot.get_channel(listener_data["discord_channel_id"])
             if discord_channel is None:
-                db.tweet_listeners.delete_one(listener_data)
+                await db.tweet_listeners.delete_one(listener_data)
 
             twitter_username = listener_data["twitter_username"]
             twitter_user = await self.bot.twtsc.get_user(username=twitter_username)
             if twitter_user is None:
-                db.tweet_listeners.delete_one(listener_data)
+                await db.tweet_listeners.delete_one(listener_data)
 
             partial_callback = partial(new_tweet, discord_channel=discord_channel)
             self.bot.twtsc.create_tweet_listener(twitter_user, partial_callback)
@@ -125,7 +125,7 @@ class Events(Cog):
         dd_time = timer["expires"] + 3600
         tm = dd_time - now
 
-        daily_debate_data = db.daily_debates.find_one({"guild_id": guild.id})
+        daily_debate_data = await db.daily_debates.find_one({"guild_id": guild.id})
         # check if there are debate topics set up
         topics = daily_debate_data["topics"]
         channel_id = daily_debate_data["channel_id"]
@@ -140,7 +140,7 @@ class Events(Cog):
             return await channel.send(msg)
         else:
             # start final timer which sends daily debate topic
-            self.bot.timers.create(
+            await self.bot.timers.create(
                 expires=dd_time,
                 guild_id=guild.id,
                 event="daily_debate_final",
@@ -152,7 +152,7 @@ class Events(Cog):
         guild_id = timer["guild_id"]
         guild = self.bot.get_guild(int(guild_id))
 
-        daily_debate_data = db.daily_debates.find_one({"guild_id": guild_id})
+        daily_debate_data = await db.daily_debates.find_one({"guild_id": guild_id})
         topic_data = daily_debate_data["topics"][0]
         topic = topic_data["topic"]
         topic_options = topic_data["topic_options"]
@@ -189,7 +189,7 @@ class Events(Cog):
         msg = await dd_channel.send(message)
 
         # delete used topic
-        db.daily_debates.update_one(
+        await db.daily_debates.update_one(
             {"guild_id": guild.id}, {"$pull": {"topics": topic_data}}
         )
 
@@ -238,7 +238,7 @@ class Events(Cog):
 
                 # start 20h to send results to users
                 expires = round(time.time() + (3600 * 20))
-                self.bot.timers.create(
+                await self.bot.timers.create(
                     guild_id=guild_id,
                     expires=expires,
                     event="dd_results",
@@ -343,41 +343,34 @@ class Events(Cog):
         message_id = payload.message_id
         user_id = payload.user_id
 
-        # check if message is reaction_menu
-        anon_poll = db.timers.find_one({"extras.message_id": message_id})
-        if not anon_poll:
+        # ignore reactions on messages that aren't anonymous polls without touching the database
+        if not self.bot.anon_polls or message_id not in self.bot.anon_polls:
             return
 
-        anon_poll_data = anon_poll["extras"]
+        anon_polls = self.bot.anon_polls
 
         emote = payload.emoji.name
         if payload.emoji.is_custom_emoji():
             emote = f"<:{payload.emoji.name}:{payload.emoji.id}>"
 
         user = self.bot.get_user(user_id)
-        if user.bot or not user:
+        if not user or user.bot:
             return
 
         # poll is message sent to user in dms
-        if "main_poll_id" in anon_poll["extras"]:
-            main_poll = db.timers.find_one(
-                {"extras.message_id": anon_poll["extras"]["main_poll_id"]}
-            )
-            if emote not in main_poll["extras"]["options"]:
+        if message_id in anon_polls.temp_polls:
+            main_poll_id = anon_polls.temp_polls[message_id]
+            main_poll_data = await anon_polls.get_poll(main_poll_id)
+            if not main_poll_data or emote not in main_poll_data["options"]:
                 return
 
-            main_poll_data = main_poll["extras"]
-
             # check if user has voted for this option already
             user_pick = emote
             user_pick_hash = hashlib.md5(
                 b"%a" % config.BOT_TOKEN + b"%a" % user.id + b"%a" % user_pick
             ).hexdigest()
 
-            if (
-                f"{user.id}" in main_poll_data["voted"]
-                and user_pick_hash in main_poll_data["voted"][f"{user.id}"]
-            ):
+            if anon_polls.has_voted(main_poll_id, user.id, user_pick_hash):
                 embed = discord.Embed(
                     colour=config.EMBED_COLOUR,
                     description=f"You have already voted for {user_pick}",
@@ -385,24 +378,22 @@ class Events(Cog):
                 )
                 return await user.send(embed=embed, delete_after=10)
 
+            # count user vote, votes are written to the database in batches
+            anon_polls.add_vote(main_poll_id, user.id, emote, user_pick_hash)
+
             # inform user of what they picked
             description = f"Your vote has been counted towards {user_pick}"
             # inform user if they have more options to pick
             pick_count = int(main_poll_data["pick_count"])
-            options_picked_count = (
-                len(main_poll_data["voted"][f"{user.id}"]) + 1
-                if f"{user.id}" in main_poll_data["voted"]
-                else 1
-            )
+            options_picked_count = len(main_poll_data["voted"][f"{user.id}"])
             if options_picked_count < pick_count:
                 description += f"\nYou can pick **{pick_count - options_picked_count}** more options"
             else:
+                anon_polls.remove_temp_poll(message_id)
                 # delete poll message
-                await self.bot.http.delete_message(
-                    channel_id, anon_poll_data["message_id"]
-                )
+                await self.bot.http.delete_message(channel_id, message_id)
                 # delete temporary poll from database
-                db.timers.delete_one(anon_poll)
+                await db.timers.delete_one({"extras.message_id": message_id, "event": "delete_temp_poll"})
 
             embed = discord.Embed(
                 colour=config.EMBED_COLOUR,
@@ -412,16 +403,6 @@ class Events(Cog):
             inform_message = await user.send(embed=embed, delete_after=10)
             await inform_message.delete(delay=5)
 
-            # count user vote
-            db.timers.update_one(
-                {"extras.message_id": main_poll_data["message_id"]},
-                {
-                    "$inc": {f"extras.results.{emote}": 1},
-                    "$push": {f"extras.voted.{user.id}": user_pick_hash},
-                },
-                upsert=True,
-            )
-
         if not guild_id:
             return
 
@@ -436,6 +417,10 @@ class Events(Cog):
             member = await guild.fetch_member(user_id)
 
         if emote == "🇻":
+            anon_poll_data = await anon_polls.get_poll(message_id)
+            if not anon_poll_data:
+                return
+
             question = anon_poll_data["question"]
 
             # check if poll is restricted to role
@@ -485,31 +470,34 @@ class Events(Cog):
                 await msg.add_reaction(e)
 
             # check if there is already an active temporary timer
-            temp_timer_data = db.timers.find_one({"extras.main_poll_id": message_id})
+            temp_timer_data = await db.timers.find_one({"extras.main_poll_id": message_id})
             if temp_timer_data:
-                db.timers.delete_one({"extras.main_poll_id": message_id})
+                await db.timers.delete_one({"extras.main_poll_id": message_id})
+                anon_polls.remove_temp_poll(temp_timer_data["extras"]["message_id"])
                 await self.bot.http.delete_message(
                     temp_timer_data["extras"]["channel_id"],
                     temp_timer_data["extras"]["message_id"],
                 )
 
             expires = int(time.time()) + (60 * 10)  # 10 minutes
-            self.bot.timers.create(
+            await self.bot.timers.create(
                 guild_id=0,
                 expires=expires,
                 event="delete_temp_poll",
                 extras={
-                    "main_poll_id": anon_poll["extras"]["message_id"],
+                    "main_poll_id": message_id,
                     "channel_id": msg.channel.id,
                     "message_id": msg.id,
                     "user_id": member.id,
                 },
             )
+            anon_polls.add_temp_poll(msg.id, message_id)
 
     @Cog.listener()
     async def on_delete_temp_poll_timer_over(self, timer):
         channel_id = timer["extras"]["channel_id"]
         message_id = timer["extras"]["message_id"]
+        self.bot.anon_polls.remove_temp_poll(message_id)
 
         try:
             return await self.bot.http.delete_message(channel_id, message_id)
@@ -527,7 +515,15 @@ class Events(Cog):
                     if role.name == before.name:
                         role.name = after.name
 
-                        db.leveling_users.update_many(
+                        # cached members would write the old name back with their next update
+                        for leveling_member in leveling_guild.members:
+                            user_branch = leveling_member.parliamentary if branch.name[0] == 'p' else leveling_member.honours
+                            if user_branch.role == before.name:
+                                user_branch.role = after.name
+
+                        # buffered updates could still have the old name, they need to be written before the rename
+                        await self.bot.leveling_system.write_buffer.flush()
+                        await db.leveling_users.update_many(
                             {
                                 "guild_id": after.guild.id,
                                 f"{branch.name[0]}_role": before.name,
@@ -560,19 +556,25 @@ class Events(Cog):
 
         # see if user is in left_leveling_users, if they are, move the data back to leveling_users
 
-        left_user = db.left_leveling_users.find_one(
+        left_user = await db.left_leveling_users.find_one(
             {"guild_id": guild_id, "user_id": user_id}
         )
         if left_user:
             # transfer back data
-            db.left_leveling_users.delete_many(
+            await db.left_leveling_users.delete_many(
                 {"guild_id": guild_id, "user_id": user_id}
             )
             del left_user["_id"]
-            db.leveling_users.insert_one(left_user)
+            await db.leveling_users.insert_one(left_user)
+
+            if self.bot.leveling_system:
+                leveling_guild = self.bot.leveling_system.get_guild(guild_id)
+                if leveling_guild:
+                    for name, leaderboard in leveling_guild.leaderboards.items():
+                        leaderboard.update(user_id, left_user.get(f"{name[0]}p", 0))
 
             # delete timer
-            db.timers.delete_one(
+            await db.timers.delete_one(
                 {
                     "guild_id": guild_id,
                     "extras.user_id": user_id,
@@ -606,29 +608,34 @@ class Events(Cog):
             print("Triggering on_member leave in Captcha module.")
             await self.bot.captcha.on_member_leave(member)
 
-        leveling_user = db.leveling_users.find_one(
+        if not self.bot.leveling_system:
+            return
+
+        # make sure the data that will be transferred is up to date
+        await self.bot.leveling_system.write_buffer.flush()
+        leveling_user = await db.leveling_users.find_one(
             {"guild_id": member.guild.id, "user_id": member.id}
         )
 
         if not leveling_user:
             return
 
-        self.bot.leveling_system.transfer_leveling_data(leveling_user)
+        await self.bot.leveling_system.transfer_leveling_data(leveling_user)
 
     @Cog.listener()
     async def on_leveling_data_expires_timer_over(self, timer: dict):
         # delete user from left_leveling_users
-        db.left_leveling_users.delete_one(
+        await db.left_leveling_users.delete_one(
             {"guild_id": timer["guild_id"], "user_id": timer["extras"]["user_id"]}
         )
 
     @Cog.listener()
     async def on_guild_channel_delete(self, channel):
-        ticket = db.tickets.find_one(
+        ticket = await db.tickets.find_one(
             {"guild_id": channel.guild.id, "channel_id": channel.id}
         )
         if ticket:
-            db.tickets.delete_one({"_id": ObjectId(ticket["_id"])})
+            await db.tickets.delete_one({"_id": ObjectId(ticket["_id"])})
 
     @Cog.listener()
     async def on_rep_at_timer_over(self, timer: dict):
@@ -667,10 +674,16 @@ class Events(Cog):
     @Cog.listener()
     async def on_ban(self, member: discord.Member):
         # delete user from leveling_users
-        db.leveling_users.delete_one(
+        await db.leveling_users.delete_one(
             {"guild_id": member.guild.id, "user_id": member.id}
         )
 
+        if self.bot.leveling_system:
+            leveling_guild = self.bot.leveling_system.get_guild(member.guild.id)
+            if leveling_guild:
+                for leaderboard in leveling_guild.leaderboards.values():
+                    leaderboard.remove(member.id)
+
 
 def setup(bot):
     bot.add_cog(Events(bot))
@@ -4,6 +4,8 @@ import math
 import datetime
 import functools
 import re
+import sys
+import heapq
 from bot import TLDR
 from modules.utils import (
     ParseArgs,
@@ -15,47 +17,68 @@ from modules import embed_maker, commands, database, format_time, leveling
 from random import randint
 from discord.ext.commands import Cog, command, Context, group
 from modules.reaction_menus import BookMenu
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class Cooldown:
-    def __init__(self, cooldown_in_seconds: int = 60):
-        self.cooldown_in_seconds = cooldown_in_seconds
-        self.cooldown_users = {}
-
-    def add_user(self, guild_id: int, user_id: int):
-        if guild_id not in self.cooldown_users:
-            self.cooldown_users[guild_id] = {}
-
-        now = time.time() + self.cooldown_in_seconds
-        self.cooldown_users[guild_id][user_id] = now
-
-    def user_cooldown(self, guild_id: int, user_id: int) -> int:
-        if guild_id not in self.cooldown_users:
-            self.cooldown_users[guild_id] = {}
-
-        if user_id in self.cooldown_users[guild_id]:
-            now = time.time()
-            cooldown_time = self.cooldown_users[guild_id][user_id] - now
-            if cooldown_time < 0:
-                del self.cooldown_users[guild_id][user_id]
-                cooldown_time = 0
-        else:
-            cooldown_time = 0
+    """
+    Point earning cooldowns of all the branches in one structure.
+
+    Cooldowns are stored in a dict keyed by (branch, guild_id, user_id) and a min-heap ordered by expiry time,
+    expired cooldowns are popped off the heap every time a cooldown is checked, so the structure only ever holds
+    the cooldowns of users who have talked in the last cooldown period.
+    """
+
+    def __init__(self, cooldowns: dict = None):
+        # branch to cooldown in seconds
+        self.cooldowns = cooldowns or {'pp': 60, 'hp': 60}
+        self.expires = {}
+        self.heap = []
+
+    def __len__(self):
+        return len(self.expires)
+
+    def expire(self, now: float):
+        while self.heap and self.heap[0][0] <= now:
+            expires, key = heapq.heappop(self.heap)
+            # the heap entry might be stale if the cooldown was started again after it
+            if self.expires.get(key) == expires:
+                del self.expires[key]
+
+    def add_user(self, guild_id: int, user_id: int, branch: str = 'pp'):
+        key = (branch, guild_id, user_id)
+        expires = time.time() + self.cooldowns[branch]
+        self.expires[key] = expires
+        heapq.heappush(self.heap, (expires, key))
+
+    def user_cooldown(self, guild_id: int, user_id: int, branch: str = 'pp') -> int:
+        now = time.time()
+        self.expire(now)
+
+        expires = self.expires.get((branch, guild_id, user_id))
+        cooldown_time = expires - now if expires else 0
 
         if not cooldown_time:
-            self.add_user(guild_id, user_id)
+            self.add_user(guild_id, user_id, branch)
 
         return int(cooldown_time)
 
+    def stats(self) -> dict:
+        return {
+            'entries': len(self.expires),
+            'heap_entries': len(self.heap),
+            'memory': sys.getsizeof(self.expires) + sys.getsizeof(self.heap) + sum(
+                sys.getsizeof(entry) + sys.getsizeof(entry[1]) for entry in self.heap
+            )
+        }
+
 
 class Leveling(Cog):
     def __init__(self, bot: TLDR):
         self.bot = bot
 
-        # parliamentary points earn cooldown
-        self.pp_cooldown = Cooldown()
-        self.hp_cooldown = Cooldown()
+        # parliamentary and honours points earn cooldowns
+        self.cooldown = Cooldown({'pp': 60, 'hp': 60})
 
     @command(
         help='Show someone you respect them by giving them a reputation point',
@@ -134,7 +157,7 @@ class Leveling(Cog):
 
         # start rep timer if giving leveling_member has rep@ enabled
         if giving_leveling_member.settings.rep_at:
-            self.bot.timers.create(
+            await self.bot.timers.create(
                 guild_id=ctx.guild.id,
                 expires=round(time.time()) + 86400,  # 24 hours
                 event='rep_at',
@@ -184,10 +207,8 @@ class Leveling(Cog):
             embed = await embed_maker.message(ctx, author={'name': 'Ranks'})
 
             # Looks up how many people have a role
-            count = {
-                role.name: db.leveling_users.count({'guild_id': ctx.guild.id, f'{branch.name[0]}_role': role.name, f'{branch.name[0]}p': {'$gt': 0}})
-                for role in branch.roles
-            }
+            role_counts = await leveling_guild.role_counts(branch)
+            count = {role.name: role_counts.get(role.name, 0) for role in branch.roles}
 
             value = ''
             for i, role in enumerate(branch.roles):
@@ -275,6 +296,26 @@ class Leveling(Cog):
         ctx.invoked_subcommand = ''
         return await self.ranks(ctx, branch.name)
 
+    @ranks.command(
+        name='recompute',
+        help='Recompute the levels and roles of every user on the server from their points, used after formula changes or data repairs',
+        usage='ranks recompute',
+        examples=['ranks recompute'],
+        cls=commands.Command,
+        access={'groups': ['Admins']},
+        module_dependency=['leveling_system']
+    )
+    async def ranks_recompute(self, ctx: Context):
+        leveling_guild = self.bot.leveling_system.get_guild(ctx.guild.id)
+        updated = await leveling_guild.recompute_levels()
+
+        return await embed_maker.message(
+            ctx,
+            description=f'Levels and roles have been recomputed, **{updated}** users were updated',
+            colour='green',
+            send=True
+        )
+
     @group(
         invoke_without_command=True,
         help='See all the perks that a role has to offer',
@@ -517,7 +558,7 @@ class Leveling(Cog):
         points = leveling_member.parliamentary.points
         if not level:
             # points needed until level_up
-            pp_till_next_level = round((5 / 6) * (user_level + 1) * (2 * (user_level + 1) * (user_level + 1) + 27 * (user_level + 1) + 91)) - points
+            pp_till_next_level = leveling.level_points(user_level + 1) - points
             avg_msg_needed = math.ceil(pp_till_next_level / 20)
 
             # points needed to rank up
@@ -525,13 +566,13 @@ class Leveling(Cog):
             missing_levels = 6 - user_rank
 
             rank_up_level = user_level + missing_levels
-            pp_needed_rank_up = round((5 / 6) * rank_up_level * (2 * rank_up_level * rank_up_level + 27 * rank_up_level + 91)) - points
+            pp_needed_rank_up = leveling.level_points(rank_up_level) - points
             avg_msg_rank_up = math.ceil(pp_needed_rank_up / 20)
             description = f'Messages needed to:\n'\
                           f'Level up: **{avg_msg_needed}**\n'\
                           f'Rank up: **{avg_msg_rank_up}**'
         else:
-            pp_needed = round((5 / 6) * level * (2 * level * level + 27 * level + 91)) - points
+            pp_needed = leveling.level_points(level) - points
             avg_msg_needed = math.ceil(pp_needed / 20)
             description = f'Messages needed to reach level `{level}`: **{avg_msg_needed}**'
 
@@ -542,10 +583,10 @@ class Leveling(Cog):
             send=True
         )
 
-    async def construct_lb_str(self, ctx: Context, branch: leveling.LevelingRoute, sorted_users: list, index: int, your_pos: bool = False):
+    async def construct_lb_str(self, ctx: Context, branch: leveling.LevelingRoute, user_ids: list, index: int, your_pos: bool = False):
         lb_str = ''
-        for i, leveling_user in enumerate(sorted_users):
-            leveling_member = await self.bot.leveling_system.get_member(ctx.guild.id, leveling_user['user_id'])
+        for i, user_id in enumerate(user_ids):
+            leveling_member = await self.bot.leveling_system.get_member(ctx.guild.id, user_id)
             addition = 0 if your_pos else 1
 
             member = leveling_member.member
@@ -574,9 +615,9 @@ class Leveling(Cog):
 
         return lb_str
 
-    async def construct_lb_embed(self, ctx: Context, branch: leveling.LevelingRoute, user_index: int, sorted_users: list, page_size_limit: int, max_page_num: int, *, page: int):
-        sorted_users_page = sorted_users[page_size_limit * (page - 1):page_size_limit * page]
-        leaderboard_str = await self.construct_lb_str(ctx, branch, sorted_users_page, index=page_size_limit * (page - 1))
+    async def construct_lb_embed(self, ctx: Context, branch: leveling.LevelingRoute, user_index: int, leaderboard: leveling.Leaderboard, page_size_limit: int, max_page_num: int, *, page: int):
+        user_ids_page = leaderboard.page(page, page_size_limit)
+        leaderboard_str = await self.construct_lb_str(ctx, branch, user_ids_page, index=page_size_limit * (page - 1))
         description = 'Damn, this place is empty' if not leaderboard_str else leaderboard_str
 
         leaderboard_embed = await embed_maker.message(
@@ -587,9 +628,9 @@ class Leveling(Cog):
         )
 
         # Displays user position under leaderboard and users above and below them if user is below position 10
-        if user_index < len(sorted_users) and not (user_index + 1 <= page * page_size_limit):
-            sorted_users_segment = sorted_users[user_index - 1:user_index + 2]
-            your_pos_str = await self.construct_lb_str(ctx, branch, sorted_users_segment, user_index, your_pos=True)
+        if user_index < len(leaderboard) and not (user_index + 1 <= page * page_size_limit):
+            user_ids_segment = leaderboard.slice(user_index - 1, user_index + 2)
+            your_pos_str = await self.construct_lb_str(ctx, branch, user_ids_segment, user_index, your_pos=True)
             leaderboard_embed.add_field(name='Your Position', value=your_pos_str)
 
         return leaderboard_embed
@@ -613,22 +654,20 @@ class Leveling(Cog):
             branch_switch = {'p': leveling_routes.parliamentary, 'h': leveling_routes.honours, 'r': leveling_routes.reputation}
             branch = branch_switch.get(branch[0], leveling_routes.parliamentary)
 
-        key = f'{branch.name[0]}p'
-        # get list of users sorted by points who have more than 0 points
-        sorted_users = [u for u in db.leveling_users.find({'guild_id': ctx.guild.id, key: {'$gt': 0}}).sort(key, -1)]
+        # index of users sorted by points, only users who have more than 0 points are counted
+        leaderboard = leveling_guild.leaderboards[branch.name]
 
         page_size_limit = 10
 
         # calculate max page number
-        max_page_num = math.ceil(len(sorted_users) / page_size_limit)
+        max_page_num = math.ceil(len(leaderboard) / page_size_limit)
         if max_page_num == 0:
             max_page_num = 1
 
         if page > max_page_num:
             return await embed_maker.error(ctx, 'Exceeded maximum page number')
 
-        leveling_user = db.get_leveling_user(ctx.guild.id, ctx.author.id)
-        user_index = sorted_users.index(leveling_user) if leveling_user in sorted_users else len(sorted_users)
+        user_index = leaderboard.position(ctx.author.id)
 
         # create function with all the needed values except page, so the function can be called with only the page kwarg
         page_constructor = functools.partial(
@@ -636,7 +675,7 @@ class Leveling(Cog):
             ctx,
             branch,
             user_index,
-            sorted_users,
+            leaderboard,
             page_size_limit,
             max_page_num
         )
@@ -672,10 +711,8 @@ class Leveling(Cog):
         progress = leveling_member.percent_till_next_level(user_branch)
 
         if verbose:
-            points_till_next_level = round(5 / 6 * (user_branch.level + 1) * (2 * (user_branch.level + 1) * (user_branch.level + 1) + 27 * (user_branch.level + 1) + 91))
-            cooldown_object = self.pp_cooldown
-
-            cooldown = f'{cooldown_object.user_cooldown(leveling_member.guild.id, leveling_member.id)} seconds'
+            points_till_next_level = leveling.level_points(user_branch.level + 1)
+            cooldown = f'{self.cooldown.user_cooldown(leveling_member.guild.id, leveling_member.id, "pp")} seconds'
 
             rank_str = f'**Rank:** `#{rank}`\n' \
                        f'**Role:** <@&{guild_role.id}>\n' \
@@ -831,7 +868,7 @@ class Leveling(Cog):
         leveling_member = await self.bot.leveling_system.get_member(guild.id, author.id)
 
         # level parliamentary route
-        if not self.pp_cooldown.user_cooldown(guild.id, author.id):
+        if not self.cooldown.user_cooldown(guild.id, author.id, 'pp'):
             pp_add = randint(15, 25)
             await leveling_member.add_points('parliamentary', pp_add)
 
@@ -843,7 +880,7 @@ class Leveling(Cog):
                 await leveling_member.level_up_message(message, leveling_member.parliamentary, current_role, roles_up)
 
         # level honours route
-        if message.channel.id in leveling_member.guild.honours_channels and not self.hp_cooldown.user_cooldown(guild.id, author.id):
+        if message.channel.id in leveling_member.guild.honours_channels and not self.cooldown.user_cooldown(guild.id, author.id, 'hp'):
             hp_add = randint(7, 12)
             await leveling_member.add_points('honours', hp_add)
 
@@ -596,7 +596,7 @@ class Mod(Cog):
             await member.add_roles(mute_role)
 
         # start automatic unmute timer
-        self.bot.timers.create(
+        await self.bot.timers.create(
             guild_id=ctx.guild.id,
             expires=round(time.time()) + duration,
             event='automatic_unmute',
@@ -820,7 +820,7 @@ class Mod(Cog):
         if not watchlist_user:
             return await embed_maker.error(ctx, 'User is not on the watchlist')
 
-        self.bot.watchlist.add_filters(member, filters)
+        await self.bot.watchlist.add_filters(member, filters)
 
         return await embed_maker.message(
             ctx,
@@ -1272,7 +1272,7 @@ class Mod(Cog):
 
         # -1h so mods can be warned when there are no daily debate topics set up
         timer_expires = round(time.time()) + time_diff_seconds - 3600  # one hour
-        self.bot.timers.create(guild_id=guild_id, expires=timer_expires, event='daily_debate', extras={})
+        await self.bot.timers.create(guild_id=guild_id, expires=timer_expires, event='daily_debate', extras={})
 
 
 def setup(bot):
@@ -10,7 +10,6 @@ import config
 import discord
 import pytz
 from bot import TLDR
-from bson import ObjectId
 from discord.ext.commands import Cog, Context, command
 from emoji.unicode_codes.en import (EMOJI_ALIAS_UNICODE_ENGLISH,
                                     EMOJI_UNICODE_ENGLISH)
@@ -20,7 +19,7 @@ from modules import commands, database, embed_maker, format_time
 from modules.utils import ParseArgs, get_custom_emote, get_member
 from timezonefinder import TimezoneFinder
 
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class Utility(Cog):
@@ -282,7 +281,7 @@ class Utility(Cog):
 
         # start timer
         # we shall also use the timer to keep track of votes and who voted
-        self.bot.timers.create(
+        await self.bot.timers.create(
             guild_id=ctx.guild.id,
             expires=expires,
             event="anon_poll",
@@ -301,9 +300,28 @@ class Utility(Cog):
                 "restrict_role": None if not restrict_role else restrict_role.id,
             },
         )
+        self.bot.anon_polls.add_poll(poll_msg.id)
 
     @Cog.listener()
     async def on_anon_poll_timer_over(self, timer):
+        expired = round(time.time()) > timer["extras"]["true_expire"]
+        # hold the lock so buffered votes aren't flushed to a timer which is being replaced
+        async with self.bot.anon_polls.lock:
+            self.bot.anon_polls.apply_tally(timer)
+
+            # run poll timer again if needed
+            if not expired and timer["extras"]["update_interval"]:
+                expires = round(time.time()) + round(timer["extras"]["update_interval"])
+                await self.bot.timers.create(
+                    guild_id=timer["guild_id"],
+                    expires=expires,
+                    event="anon_poll",
+                    extras=timer["extras"],
+                )
+
+        return await self.update_anon_poll(timer, expired)
+
+    async def update_anon_poll(self, timer, expired: bool):
         message_id = timer["extras"]["message_id"]
         channel_id = timer["extras"]["channel_id"]
         guild_id = timer["guild_id"]
@@ -353,7 +371,6 @@ class Utility(Cog):
         else:
             embed.set_footer(text="Ended at")
 
-        expired = round(time.time()) > true_expire
         if not expired:
             description += "\n\nReact with :regional_indicator_v: to vote"
             if timer["extras"]["restrict_role"]:
@@ -373,12 +390,14 @@ class Utility(Cog):
             # delete poll from db
             await message.clear_reactions()
 
+            self.bot.anon_polls.remove_poll(message.id)
+
             # delete any remaining temp polls in dms
-            temp_polls = [
-                d for d in db.timers.find({"extras.main_poll_id": message.id})
-            ]
+            temp_polls = await db.timers.find(
+                {"extras.main_poll_id": message.id}
+            ).to_list(length=None)
             if temp_polls:
-                db.timers.delete_many({"main_poll_id": message.id})
+                await db.timers.delete_many({"extras.main_poll_id": message.id})
                 for poll in temp_polls:
                     await self.bot.http.delete_message(
                         poll["extras"]["channel_id"], poll["extras"]["message_id"]
@@ -389,16 +408,6 @@ class Utility(Cog):
                 f"Anonymous poll finished: https://discordapp.com/channels/{guild_id}/{channel_id}/{message.id}"
             )
 
-        # run poll timer again if needed
-        elif update_interval:
-            expires = round(time.time()) + round(update_interval)
-            return self.bot.timers.create(
-                guild_id=timer["guild_id"],
-                expires=expires,
-                event="anon_poll",
-                extras=timer["extras"],
-            )
-
     @staticmethod
     def remove_last_char(msg: str):
         pos = len(msg) - 1
@@ -515,19 +524,13 @@ class Utility(Cog):
         cls=commands.Command,
     )
     async def reminders(self, ctx: Context, action: str = None, *, index: str = None):
-        user_reminders = sorted(
-            [
-                r
-                for r in db.timers.find(
-                    {
-                        "guild_id": ctx.guild.id,
-                        "event": "reminder",
-                        "extras.member_id": ctx.author.id,
-                    }
-                )
-            ],
-            key=lambda r: r["expires"],
-        )
+        user_reminders = await db.timers.find(
+            {
+                "guild_id": ctx.guild.id,
+                "event": "reminder",
+                "extras.member_id": ctx.author.id,
+            }
+        ).sort("expires", 1).to_list(length=None)
         if action is None:
             if not user_reminders:
                 msg = "You currently have no reminders"
@@ -545,7 +548,7 @@ class Utility(Cog):
             return await embed_maker.command_error(ctx, "(reminder index)")
         else:
             timer = user_reminders[int(index) - 1]
-            db.timers.delete_one({"_id": ObjectId(timer["_id"])})
+            await self.bot.timers.cancel(timer["_id"])
             return await embed_maker.message(
                 ctx,
                 description=f'`{timer["extras"]["reminder"]}` has been removed from your list of reminders',
@@ -574,7 +577,7 @@ class Utility(Cog):
             return await embed_maker.error(ctx, "You cannot have an empty reminder")
 
         expires = round(time.time()) + remind_time
-        self.bot.timers.create(
+        await self.bot.timers.create(
             expires=expires,
             guild_id=ctx.guild.id,
             event="reminder",
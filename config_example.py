@@ -4,6 +4,10 @@ BOT_TOKEN = ""
 PREFIX = ">>"
 EMBED_COLOUR = 0x00A6AD
 MONGODB_URL = "mongodb://10.171.63.66:27017"
+MONGODB_POOL_SIZE = 100
+# how many leveling members are kept in memory per guild and for how many seconds after they were last used
+LEVELING_MEMBER_CACHE_SIZE = 10000
+LEVELING_MEMBER_CACHE_TTL = 3600
 DEV_IDS = []
 
 MAIN_SERVER = 0
@@ -0,0 +1,186 @@
+import asyncio
+import copy
+from typing import Optional
+
+from modules import database, timers
+
+db = database.get_async_connection()
+
+
+class AnonPolls:
+    """
+    Keeps track of the message ids of the active anonymous polls, so reactions on other messages can be ignored
+    without querying the database.
+
+    Attributes
+    ---------------
+    bot: :class:`bot.TLDR`
+        The discord bot.
+    polls: :class:`set`
+        Message ids of the main polls, sent in guild channels.
+    temp_polls: :class:`dict`
+        Dictionary of the message id of a temporary poll sent to a user in dms, to the message id of its main poll.
+    tallies: :class:`dict`
+        Dictionary of main poll message id to the poll's tally, votes are counted here and periodically flushed to
+        the poll's timer. A tally holds the poll's `extras` with all the votes and the `results` and `voted` which
+        haven't been written to the database yet.
+    lock: :class:`asyncio.Lock`
+        Held while votes are being flushed or while a poll's timer is being replaced, so votes aren't written twice.
+    replacing: :class:`dict`
+        Dictionary of main poll message id to :class:`asyncio.Event`, set when the tally of a poll whose timer has run out
+        has been set up by :func:`apply_tally`, votes that couldn't find the poll's timer wait for it.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.polls = set()
+        self.temp_polls = {}
+        self.tallies = {}
+        self.lock = asyncio.Lock()
+        self.replacing = {}
+        self.bot.add_listener(self.on_ready, 'on_ready')
+        self.bot.logger.info('AnonPolls module has been initiated')
+
+    async def on_ready(self):
+        await self.initialize()
+        self.flush_votes.start()
+
+    @timers.loop(seconds=10)
+    async def flush_votes(self):
+        """Periodically write the buffered votes to the database."""
+        await self.flush()
+
+    async def initialize(self):
+        """Load the message ids of the active polls from the timers collection."""
+        poll_timers = db.timers.find(
+            {'event': {'$in': ['anon_poll', 'delete_temp_poll']}},
+            {'event': 1, 'extras.message_id': 1, 'extras.main_poll_id': 1}
+        )
+        async for timer in poll_timers:
+            if timer['event'] == 'anon_poll':
+                self.add_poll(timer['extras']['message_id'])
+            else:
+                self.add_temp_poll(timer['extras']['message_id'], timer['extras']['main_poll_id'])
+
+    def __contains__(self, message_id: int):
+        return message_id in self.polls or message_id in self.temp_polls
+
+    def add_poll(self, message_id: int):
+        self.polls.add(message_id)
+
+    def remove_poll(self, message_id: int):
+        """Remove a main poll and all of its temporary polls."""
+        self.polls.discard(message_id)
+        self.tallies.pop(message_id, None)
+        replaced = self.replacing.pop(message_id, None)
+        if replaced:
+            replaced.set()
+        for temp_poll_id in [t for t, main_poll_id in self.temp_polls.items() if main_poll_id == message_id]:
+            del self.temp_polls[temp_poll_id]
+
+    def add_temp_poll(self, message_id: int, main_poll_id: int):
+        self.temp_polls[message_id] = main_poll_id
+
+    def remove_temp_poll(self, message_id: int):
+        self.temp_polls.pop(message_id, None)
+
+    async def get_poll(self, message_id: int) -> Optional[dict]:
+        """
+        Get the extras of a main poll with all the votes, loading the poll from the database the first time.
+
+        Parameters
+        ----------------
+        message_id: :class:`int`
+            Message id of the main poll.
+
+        Returns
+        -------
+        Optional[:class:`dict`]
+            The poll's extras or `None` if the poll doesn't exist.
+        """
+        tally = self.tallies.get(message_id)
+        if tally is None:
+            timer = await db.timers.find_one({'extras.message_id': message_id, 'event': 'anon_poll'})
+            if not timer:
+                return await self.get_replaced_poll(message_id)
+
+            # another vote might've loaded the poll while this one was waiting
+            tally = self.tallies.setdefault(message_id, {'extras': timer['extras'], 'results': {}, 'voted': {}})
+
+        return tally['extras']
+
+    async def get_replaced_poll(self, message_id: int) -> Optional[dict]:
+        """Get the extras of an active poll whose timer has run out and is being replaced, once its tally is set up."""
+        if message_id not in self.polls:
+            return None
+
+        if message_id not in self.tallies:
+            replaced = self.replacing.setdefault(message_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(replaced.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                return None
+
+        tally = self.tallies.get(message_id)
+        return tally['extras'] if tally else None
+
+    def has_voted(self, message_id: int, user_id: int, user_pick_hash: str) -> bool:
+        """Check if user has already picked an option in a poll, poll needs to be loaded with :func:`get_poll`."""
+        voted = self.tallies[message_id]['extras']['voted']
+        return user_pick_hash in voted.get(f'{user_id}', [])
+
+    def add_vote(self, message_id: int, user_id: int, emote: str, user_pick_hash: str):
+        """Count a vote in the poll's tally, poll needs to be loaded with :func:`get_poll`."""
+        tally = self.tallies[message_id]
+        for data in [tally['extras'], tally]:
+            data['results'][emote] = data['results'].get(emote, 0) + 1
+            data['voted'].setdefault(f'{user_id}', []).append(user_pick_hash)
+
+    def apply_tally(self, timer: dict):
+        """
+        Replace the results and votes of a poll timer which has run out with the ones in the poll's tally,
+        or set up the poll's tally from the timer if the poll hasn't been loaded. Should be called while holding :attr:`lock`.
+
+        Parameters
+        ----------------
+        timer: :class:`dict`
+            The poll's timer.
+        """
+        message_id = timer['extras']['message_id']
+        tally = self.tallies.get(message_id)
+        if tally is None:
+            # votes made while the timer is being replaced are counted here, since the timer isn't in the database
+            self.tallies[message_id] = {'extras': copy.deepcopy(timer['extras']), 'results': {}, 'voted': {}}
+        else:
+            # the timer will be written again with all the votes, so nothing is left to flush
+            tally['results'], tally['voted'] = {}, {}
+            timer['extras']['results'] = copy.deepcopy(tally['extras']['results'])
+            timer['extras']['voted'] = copy.deepcopy(tally['extras']['voted'])
+
+        replaced = self.replacing.pop(message_id, None)
+        if replaced:
+            replaced.set()
+
+    async def flush(self):
+        """Write the buffered votes of all the polls to the database."""
+        async with self.lock:
+            for message_id, tally in list(self.tallies.items()):
+                if not tally['results']:
+                    continue
+
+                # swap the buffers, so votes counted during the write go into new ones
+                results, voted = tally['results'], tally['voted']
+                tally['results'], tally['voted'] = {}, {}
+                update = {
+                    '$inc': {f'extras.results.{emote}': count for emote, count in results.items()},
+                    '$push': {f'extras.voted.{user_id}': {'$each': hashes} for user_id, hashes in voted.items()},
+                }
+                try:
+                    await db.timers.update_one({'extras.message_id': message_id, 'event': 'anon_poll'}, update)
+                except Exception as e:
+                    self.bot.logger.exception(f'Failed to flush votes of anonymous poll [{message_id}]: {e}')
+                    # put the votes back, so they're written with the next flush
+                    for emote, count in results.items():
+                        tally['results'][emote] = tally['results'].get(emote, 0) + count
+                    for user_id, hashes in voted.items():
+                        tally['voted'][user_id] = hashes + tally['voted'].get(user_id, [])
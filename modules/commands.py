@@ -4,8 +4,9 @@ import config
 import copy
 
 from discord.ext.commands.core import hooked_wrapped_callback
+from discord.ext.commands.view import StringView
 from modules import database, embed_maker
-from typing import Callable, Union
+from typing import Callable, Optional, Union
 
 db = database.get_connection()
 
@@ -19,7 +20,18 @@ class Clearance:
         self.roles = {}
         self.command_access = {}
 
+        # spreadsheet compiled into bitmasks, every role and group gets its own bit
+        self.role_bits = {}
+        self.group_bits = {}
+        self.role_groups = {}
+        self.role_masks = {}
+        # (guild id, member id) -> member clearance, dropped when the member's roles change
+        self.member_clearances = {}
+
         self.bot.add_listener(self.on_ready, 'on_ready')
+        self.bot.add_listener(self.on_member_update, 'on_member_update')
+        self.bot.add_listener(self.on_member_remove, 'on_member_remove')
+        self.bot.add_listener(self.on_guild_role_delete, 'on_guild_role_delete')
 
         self.bot.logger.debug(f"Downloading clearance spreadsheet")
 
@@ -43,6 +55,16 @@ class Clearance:
     async def on_ready(self):
         await self.parse_clearance_spreadsheet()
 
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            self.member_clearances.pop((after.guild.id, after.id), None)
+
+    async def on_member_remove(self, member: discord.Member):
+        self.member_clearances.pop((member.guild.id, member.id), None)
+
+    async def on_guild_role_delete(self, _role: discord.Role):
+        self.member_clearances.clear()
+
     @staticmethod
     def split_comma(value: str, *, value_type: Callable = str):
         """Split string of comma separated values into a list."""
@@ -139,16 +161,76 @@ class Clearance:
                 and command_name not in self.command_access
                 and command.root_parent.name in self.command_access
             ):
-                self.command_access[command_name] = self.command_access[
-                    command.root_parent.name
-                ]
+                # sub commands get the access of the root command, unless they define their own
+                if command.access:
+                    self.command_access[command_name] = {
+                        "groups": [],
+                        "roles": [],
+                        "users": [],
+                        **command.access,
+                    }
+                else:
+                    self.command_access[command_name] = self.command_access[
+                        command.root_parent.name
+                    ]
                 continue
 
+        self.compile_clearance()
         self.bot.logger.debug(f"Clearance spreadsheet has been parsed")
 
+    def compile_clearance(self):
+        """
+        Compile the parsed spreadsheet into bitmasks, so member clearance can be worked out by OR-ing together
+        the masks of member's roles and checked against commands with a single AND.
+        """
+        # everyone has the default "User" role
+        self.role_bits = {"User": 1}
+        for role_name in self.roles:
+            self.role_bits.setdefault(role_name, 1 << len(self.role_bits))
+
+        self.group_bits = {
+            group_name: 1 << (len(self.role_bits) + i)
+            for i, group_name in enumerate(self.groups)
+        }
+
+        self.role_groups = {
+            role_name: [
+                group_name
+                for group_name, roles in self.groups.items()
+                if role_name in roles
+            ]
+            for role_name in self.roles
+        }
+
+        self.role_masks = {}
+        for role_name, role_id in self.roles.items():
+            mask = self.role_bits[role_name]
+            for group_name in self.role_groups[role_name]:
+                mask |= self.group_bits[group_name]
+
+            self.role_masks[role_id] = self.role_masks.get(role_id, 0) | mask
+
+        for command_clearance in self.command_access.values():
+            command_clearance["mask"] = self.clearance_mask(
+                command_clearance["roles"], command_clearance["groups"]
+            )
+
+        self.member_clearances.clear()
+
+    def clearance_mask(self, roles: list, groups: list) -> int:
+        """Turn lists of role and group names into a bitmask, names not in the spreadsheet are ignored."""
+        mask = 0
+        for role_name in roles:
+            mask |= self.role_bits.get(role_name, 0)
+        for group_name in groups:
+            mask |= self.group_bits.get(group_name, 0)
+
+        return mask
+
     def member_clearance(self, member: discord.Member):
         """
         Returns dict with info about what group user belongs to and what roles they have.
+        The result is cached until the member's roles change.
 
         Parameters
         ----------------
@@ -160,19 +242,28 @@ class Clearance:
         :class:`dict`
             Clearance info about the user.
         """
-        clearance = {"groups": [], "roles": ["User"], "user_id": member.id}
-        member_role_ids = [role.id for role in member.roles]
+        key = (member.guild.id, member.id)
+        clearance = self.member_clearances.get(key)
+        if clearance is not None:
+            return clearance
 
-        # assign roles
-        for role_name, role_id in self.roles.items():
-            if role_id in member_role_ids:
-                clearance["roles"].append(role_name)
+        mask = self.role_bits.get("User", 1)
+        for role in member.roles:
+            mask |= self.role_masks.get(role.id, 0)
+
+        clearance = {"groups": [], "roles": ["User"], "user_id": member.id, "mask": mask}
+
+        # assign roles and groups in the order they are in the spreadsheet
+        for role_name in self.roles:
+            if role_name == "User" or not mask & self.role_bits[role_name]:
+                continue
 
-                # assign a group in role is in a group
-                for group_name, roles in self.groups.items():
-                    if role_name in roles and group_name not in clearance["groups"]:
-                        clearance["groups"].append(group_name)
+            clearance["roles"].append(role_name)
+            for group_name in self.role_groups[role_name]:
+                if group_name not in clearance["groups"]:
+                    clearance["groups"].append(group_name)
 
+        self.member_clearances[key] = clearance
         return clearance
 
     @staticmethod
@@ -203,13 +294,17 @@ class Clearance:
         """
         return self.command_access[command.full_name]
 
-    @staticmethod
-    def member_has_clearance(member_clearance: dict, command_clearance: dict):
+    def member_has_clearance(self, member_clearance: dict, command_clearance: dict):
         """Function for checking id member clearance and command clearance match"""
+        command_mask = command_clearance.get("mask")
+        if command_mask is None:
+            command_mask = self.clearance_mask(
+                command_clearance["roles"], command_clearance["groups"]
+            )
+
         return (
             member_clearance["user_id"] in command_clearance["users"]
-            or set(command_clearance["roles"]) & set(member_clearance["roles"])
-            or set(command_clearance["groups"]) & set(member_clearance["groups"])
+            or member_clearance["mask"] & command_mask != 0
         )
 
     async def refresh_data(self):
@@ -265,6 +360,11 @@ class Command(discord.ext.commands.Command):
     special_help: :class:`bool`
         Only True if command decorator has a clearance :class:`Help` object defined.
         Example: cogs.template_cog line 17
+    clearance_copies: :class:`dict`
+        Copies of the command with help specified to a clearance, keyed by the clearance shown in the help.
+    access: Optional[:class:`dict`]
+        The groups, roles and users which have access to a sub command which isn't in the clearance spreadsheet,
+        instead of the access of the root command.
     """
 
     def __init__(self, func, **kwargs):
@@ -276,12 +376,16 @@ class Command(discord.ext.commands.Command):
         )
         self.bot = None
         self.data = {}
+        self.clearance_copies = {}
+        self.access = kwargs.get("access", None)
         self.initialize_command_data()
 
     def update_command_data(self, guild_id: int):
         """Update command data."""
         data = db.get_command_data(guild_id, self.full_name, insert=True)
         self.data = data
+        # copies hold on to the old data
+        self.clearance_copies.clear()
 
     @property
     def disabled(self):
@@ -317,11 +421,57 @@ class Command(discord.ext.commands.Command):
             member_clearance, command_clearance
         )
 
+    def help_clearance(self, member: discord.Member) -> str:
+        """Returns the clearance shown in the help of the command to the member."""
+        if not self.bot.clearance:
+            return "*"
+
+        member_clearance = self.bot.clearance.member_clearance(member)
+        if (
+            self.special_help_group
+            and self.special_help_group in member_clearance["groups"]
+        ):
+            return self.special_help_group
+
+        return self.bot.clearance.highest_member_clearance(member_clearance)
+
+    def clearance_copy(self, member: discord.Member):
+        """
+        Get a copy of the command with help specified to the member's clearance, so the original command isn't
+        modified. Copies are made once per clearance and reused.
+
+        Parameters
+        ___________
+        member: :class:`discord.Member`
+            Member to whom the help of the copy will be specified to.
+
+        Returns
+        -------
+        Union[:class:`Command`, :class:`Group`]
+            Copy of the command.
+        """
+        clearance = self.help_clearance(member)
+        command = self.clearance_copies.get(clearance)
+        if command is None:
+            # only members in the special help group get it as their clearance
+            if clearance == self.special_help_group:
+                help_object = self.__original_kwargs__[self.special_help_group]
+            else:
+                help_object = copy.copy(self.docs)
+            help_object.clearance = clearance
+
+            command = copy.copy(self)
+            command.docs = help_object
+            self.clearance_copies[clearance] = command
+
+        return command
+
     def get_help(self, member: discord.Member = None) -> Help:
         """
         A function to get a user specific help object of a command.
         If command has special_help and user has the required clearance for it, it'll switch out the help values.
-        As to not edit the original help object of the command, a copy is made at the beginning.
+        Help objects specified to a member are shared between members with the same clearance and shouldn't be
+        modified.
 
         Parameters
         ___________
@@ -334,31 +484,10 @@ class Command(discord.ext.commands.Command):
             The default help object if the special help group doesnt exist or user doesnt have clearance for it, otherwise
             the modified help object.
         """
-        help_object = copy.copy(self.docs)
-
         if member is None:
-            return help_object
-
-        member_clearance = (
-            self.bot.clearance.member_clearance(member)
-            if self.bot.clearance
-            else {"groups": ["*"], "roles": ["*"], "user_id": member.id}
-        )
+            return copy.copy(self.docs)
 
-        if (
-            self.special_help_group
-            and self.special_help_group in member_clearance["groups"]
-        ):
-            help_object = self.__original_kwargs__[self.special_help_group]
-            help_object.clearance = self.special_help_group
-        else:
-            help_object.clearance = (
-                self.bot.clearance.highest_member_clearance(member_clearance)
-                if self.bot.clearance
-                else "*"
-            )
-
-        return help_object
+        return self.clearance_copy(member).docs
 
     def sub_commands(self):
         """Empty method."""
@@ -388,6 +517,41 @@ class Group(discord.ext.commands.Group, Command):
         return sub_commands
 
 
+def resolve_sub_command(command: Union[Command, Group], view: StringView) -> Optional[Union[Command, Group]]:
+    """
+    Find the sub command which is actually being run from the words left in the view after the command name.
+    Gives the same result as :func:`discord.ext.commands.Bot.get_command` with the full message, but stops reading
+    words as soon as the result is known and doesn't modify the view.
+
+    Parameters
+    ___________
+    command: Union[:class:`Command`, :class:`Group`]
+        The invoked root command.
+    view: :class:`discord.ext.commands.view.StringView`
+        The view of the message, positioned after the command name.
+
+    Returns
+    -------
+    Optional[Union[:class:`Command`, :class:`Group`]]
+        The command or sub command, None if the words after a group aren't its sub commands.
+    """
+    if not isinstance(command, discord.ext.commands.GroupMixin):
+        return command
+
+    index, previous = view.index, view.previous
+    view.skip_ws()
+    while command is not None:
+        word = view.get_word()
+        if not word:
+            break
+
+        all_commands = getattr(command, "all_commands", None)
+        command = all_commands.get(word) if all_commands is not None else None
+
+    view.index, view.previous = index, previous
+    return command
+
+
 class CommandSystem:
     def __init__(self, bot):
         self.bot = bot
@@ -7,7 +7,7 @@ from typing import Optional
 from discord.ext.commands import Context, MemberConverter, RoleConverter, TextChannelConverter
 from modules import database
 
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class User:
@@ -157,6 +157,150 @@ class Role:
             raise Exception('Accessing forbidden fruit')
 
 
+class CustomCommandMatcher:
+    """
+    Matches messages against the custom commands of a guild with precompiled patterns.
+
+    For every command name the longest piece of plain text which every match has to contain is worked out, so most
+    messages can be ruled out with a substring check before the compiled pattern is searched. Names without any
+    regex syntax are matched with the substring check alone.
+
+    Attributes
+    ---------------
+    commands: :class:`list`
+        List of (compiled pattern, required text or None, is literal, custom command) tuples in database order.
+    """
+    metacharacters = frozenset('.^$*+?{}[]\\|()')
+    # case insensitive and verbose patterns don't contain their text as is
+    text_flags = re.compile(r'\(\?[aiLmsux-]*[ix]')
+    quantifier = re.compile(r'{\d*,?\d*}')
+
+    def __init__(self, commands: list):
+        self.commands = []
+        for cc in commands:
+            try:
+                pattern = re.compile(cc['name'])
+            except re.error:
+                continue
+
+            literal = not self.metacharacters.intersection(cc['name'])
+            required = cc['name'] if literal else self.required_text(cc['name'])
+            self.commands.append((pattern, required or None, literal, cc))
+
+    @classmethod
+    def required_text(cls, name: str) -> str:
+        """
+        Find the longest plain text outside of groups and character classes which every match of pattern has to
+        contain. Anything that might be optional ends the text, so the result can be shorter than possible, but
+        it's never wrong.
+
+        Parameters
+        ----------------
+        name: :class:`str`
+            The custom command name, a regex pattern.
+
+        Returns
+        -------
+        :class:`str`
+            The required text, empty string if there isn't any.
+        """
+        if cls.text_flags.search(name):
+            return ''
+
+        runs = []
+        current = ''
+        depth = 0
+        in_class = False
+        i = 0
+        while i < len(name):
+            char = name[i]
+            i += 1
+            if in_class:
+                if char == '\\':
+                    i += 1
+                elif char == ']':
+                    in_class = False
+                continue
+
+            if char == '\\':
+                escaped = name[i:i + 1]
+                i += 1
+                if escaped and not escaped.isalnum() and depth == 0:
+                    current += escaped
+                    continue
+
+                runs.append(current)
+                current = ''
+                # skip the rest of hex, unicode and named escapes and numbered backreferences
+                if escaped == 'x':
+                    i += 2
+                elif escaped == 'u':
+                    i += 4
+                elif escaped == 'U':
+                    i += 8
+                elif escaped == 'N':
+                    i = name.find('}', i) + 1 or len(name)
+                elif escaped.isdigit():
+                    while i < len(name) and name[i].isdigit():
+                        i += 1
+                continue
+
+            if name.startswith('(?#', i - 1):
+                # comments don't match anything, a quantifier after one applies to the character before it
+                i = name.find(')', i) + 1 or len(name)
+                continue
+
+            if char in '*?{':
+                # previous character is optional
+                current = current[:-1]
+                if char == '{':
+                    quantifier = cls.quantifier.match(name, i - 1)
+                    i = quantifier.end() if quantifier else i
+            elif char == '|' and depth == 0:
+                return ''
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == '[':
+                in_class = True
+                # "]" right at the start of a class is a literal
+                if name[i:i + 1] == '^':
+                    i += 1
+                if name[i:i + 1] == ']':
+                    i += 1
+            elif char not in cls.metacharacters and depth == 0:
+                current += char
+                continue
+
+            runs.append(current)
+            current = ''
+
+        runs.append(current)
+        return max(runs, key=len)
+
+    def match(self, content: str) -> Optional[dict]:
+        """
+        Find the first custom command whose name matches the content.
+
+        Parameters
+        ----------------
+        content: :class:`str`
+            The message content.
+
+        Returns
+        -------
+        Optional[:class:`dict`]
+            The custom command if one is found.
+        """
+        for pattern, required, literal, cc in self.commands:
+            if required is not None and required not in content:
+                continue
+
+            if literal or pattern.search(content):
+                return cc
+
+
 class CustomCommands:
     """
     Handler of custom commands.
@@ -165,13 +309,47 @@ class CustomCommands:
     ---------------
     bot: :class:`bot.TLDR`
         Bot instance.
+    matchers: :class:`dict`
+        Dictionary of guild id to the guild's :class:`CustomCommandMatcher`, built the first time a guild's message
+        is matched and dropped by :func:`invalidate` when the guild's custom commands are changed.
     """
     def __init__(self, bot):
         self.bot = bot
+        self.matchers = {}
+        # bumped on every invalidation, so a matcher loaded before a change isn't cached
+        self.versions = {}
         self.bot.logger.info('CustomCommands module has been initiated')
 
-    @staticmethod
-    def match_message(message: discord.Message) -> Optional[dict]:
+    async def get_matcher(self, guild_id: int) -> CustomCommandMatcher:
+        """
+        Get the custom command matcher of a guild, loading the guild's custom commands if it isn't cached.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild.
+
+        Returns
+        -------
+        :class:`CustomCommandMatcher`
+            The guild's matcher.
+        """
+        matcher = self.matchers.get(guild_id)
+        if matcher is None:
+            version = self.versions.get(guild_id, 0)
+            custom_commands = await db.custom_commands.find({'guild_id': guild_id}).to_list(length=None)
+            matcher = CustomCommandMatcher(custom_commands)
+            if self.versions.get(guild_id, 0) == version:
+                self.matchers[guild_id] = matcher
+
+        return matcher
+
+    def invalidate(self, guild_id: int):
+        """Drop the cached matcher of a guild, should be called when the guild's custom commands are changed."""
+        self.matchers.pop(guild_id, None)
+        self.versions[guild_id] = self.versions.get(guild_id, 0) + 1
+
+    async def match_message(self, message: discord.Message) -> Optional[dict]:
         """
         Matches discord message against custom commands.
 
@@ -185,11 +363,8 @@ class CustomCommands:
         :class:`dict`
             A custom command if one is found.
         """
-        # using aggregation match custom command "name" value against message content
-        custom_commands = db.custom_commands.find({'guild_id': message.guild.id})
-        for cc in custom_commands:
-            if re.findall(cc['name'], message.content):
-                return cc
+        matcher = await self.get_matcher(message.guild.id)
+        return matcher.match(message.content)
 
     async def can_use(self, ctx: Context, command: dict):
         """
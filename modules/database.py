@@ -1,13 +1,17 @@
+import copy
+import time
 from typing import Union
 
 import config
 import pymongo
 from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
 
 from ukparliament.bills_tracker import FeedUpdate
 from ukparliament.divisions_tracker import CommonsDivision, LordsDivision
 
 active_connection = None
+active_async_connection = None
 
 
 class Connection:
@@ -242,13 +246,16 @@ class Connection:
                 'files': :class:`list`
                 'text': :class:`str`
                 'user_id': :class`str`
-                'timestamp': :class:`int`
+                'timestamp': :class:`datetime.datetime`  # removed by a ttl index after 24 hours
             }
     tasks :class:`pymongo.collection.Collection`
         The collection for linking the api and the main bot through running tasks.
             {
                 'function': :class:`str`  # name of the function in tasks that will be called
                 'kwargs': :class:`dict`
+                'attempts': :class:`int`  # how many times the task has been claimed
+                'lease_expires': :class:`float`  # time until the task is reserved for the current attempt
+                'created_at': :class:`float`
             }
     captcha_member_cache: :class:`pymongo.collection.Collection`
         The collection for storing the last known username of a blacklisted member.
@@ -272,6 +279,12 @@ class Connection:
                 'insta_user_id': :class:`str`
                 'discord_channel_id': :class:`int`
             }
+    migrations :class:`pymongo.collection.Collection`
+        The collection for recording which one-off data migrations have been run.
+            {
+                '_id': :class:`str`  # name of the migration
+                'timestamp': :class:`datetime.datetime`
+            }
     """
 
     def __init__(self):
@@ -305,6 +318,7 @@ class Connection:
         self.tasks = self.db["tasks"]
         self.tweet_listeners = self.db["tweet_listeners"]
         self.insta_listeners = self.db["insta_listeners"]
+        self.migrations = self.db["migrations"]
 
     def clear_bills_tracker_collection(self):
         self.bills_tracker.delete_many({})
@@ -592,6 +606,270 @@ class Connection:
         """
         self.cases.update_one({"_id": case_id}, {"$set": {"logs_url": logs_url}})
 
+    def add_task(self, function: str, **kwargs):
+        """
+        Queue a task to be run by the bot.
+
+        Parameters
+        ___________
+        function: :class:`str`
+           Name of the function in :class:`modules.tasks.Tasks` that will be called.
+        **kwargs:
+           Keyword arguments the function will be called with.
+        """
+        task = copy.deepcopy(schemas["task"])
+        task.update({"function": function, "kwargs": kwargs, "created_at": time.time()})
+        self.tasks.insert_one(task)
+
+
+class AsyncConnection:
+    """
+    Non-blocking database handler, backed by a pooled motor client.
+
+    Has the same collection attributes and helper methods as :class:`Connection`, but every query has to be awaited,
+    so that database round-trips don't stall the event loop. Should be used from anything that runs on the event loop.
+
+    Attributes
+    ---------------
+    mongo_client: :class:`motor.motor_asyncio.AsyncIOMotorClient`
+        The motor client, connections are pooled up to `config.MONGODB_POOL_SIZE`.
+    db: :class:`motor.motor_asyncio.AsyncIOMotorDatabase`
+        The TLDR database.
+
+    For the collections and their schemas, see :class:`Connection`.
+    """
+
+    def __init__(self):
+        self.mongo_client = AsyncIOMotorClient(
+            config.MONGODB_URL, maxPoolSize=config.MONGODB_POOL_SIZE
+        )
+        self.db = self.mongo_client["TLDR"]
+        self.leveling_users = self.db["leveling_users"]
+        self.leveling_data = self.db["leveling_data"]
+        self.left_leveling_users = self.db["left_leveling_users"]
+        self.timers = self.db["timers"]
+        self.commands = self.db["commands"]
+        self.daily_debates = self.db["daily_debates"]
+        self.tickets = self.db["tickets"]
+        self.custom_commands = self.db["custom_commands"]
+        self.watchlist = self.db["watchlist"]
+        self.cases = self.db["cases"]
+        self.bills_tracker = self.db["bills_tracker"]
+        self.divisions_tracker = self.db["divisions_tracker"]
+        self.guild_settings = self.db["guild_settings"]
+        self.captcha_guilds = self.db["captcha_guilds"]
+        self.captcha_channels = self.db["captcha_channels"]
+        self.captcha_blacklist = self.db["captcha_blacklist"]
+        self.captcha_counter = self.db["captcha_counter"]
+        self.captcha_member_cache = self.db["captcha_member_cache"]
+        self.captcha_registered_invitations = self.db["catpcha_registered_invitations"]
+        self.webhooks = self.db["webhooks"]
+        self.slack_bridge = self.db["slack_bridge"]
+        self.slack_messages = self.db["slack_messages"]
+        self.tasks = self.db["tasks"]
+        self.tweet_listeners = self.db["tweet_listeners"]
+        self.insta_listeners = self.db["insta_listeners"]
+        self.migrations = self.db["migrations"]
+
+    async def get_guild_settings(self, guild_id: int) -> dict:
+        """
+        Get Settings attached to guild that dont fit in other collections.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild.
+
+        Returns
+        -------
+        :class:`dict`
+            Guild's settings.
+        """
+        guild_settings = await self.guild_settings.find_one({"guild_id": guild_id})
+        if guild_settings is None:
+            guild_settings = {"guild_id": guild_id, "mute_role_id": None, "modules": {}}
+            await self.guild_settings.insert_one(guild_settings)
+
+        return guild_settings
+
+    async def get_leveling_user(self, guild_id: int, member_id: int) -> dict:
+        """
+        Get member's leveling data from the database, if user isn't in the database, they will be added.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the member's guild.
+        member_id: :class:`int`
+            ID of the member.
+
+        Returns
+        -------
+        :class:`dict`
+            Leveling data on the member.
+        """
+        leveling_user = await self.leveling_users.find_one(
+            {"guild_id": guild_id, "user_id": member_id}
+        )
+
+        if leveling_user is None:
+            # add user to leveling_user collection
+            leveling_user = copy.deepcopy(schemas["leveling_user"])
+            leveling_user["guild_id"] = guild_id
+            leveling_user["user_id"] = member_id
+            await self.leveling_users.insert_one(leveling_user.copy())
+
+        return leveling_user
+
+    async def get_leveling_data(self, guild_id: int, fields: dict = None) -> dict:
+        """
+        Get guild's leveling data from the database, if guild isn't in the database, it will be added.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild.
+        fields: Optional[:class:`dict`]
+            what fields to return when querying the database, if not set, all the data will be returned.
+
+        Returns
+        -------
+        :class:`dict`
+            Leveling data of the guild.
+        """
+        if fields:
+            leveling_data = await self.leveling_data.find_one({"guild_id": guild_id}, fields)
+        else:
+            leveling_data = await self.leveling_data.find_one({"guild_id": guild_id})
+
+        if not leveling_data:
+            leveling_data = copy.deepcopy(schemas["leveling_data"])
+            leveling_data["guild_id"] = guild_id
+            await self.leveling_data.insert_one(leveling_data.copy())
+
+        return leveling_data
+
+    async def get_command_data(self, command_name: str, *, insert: bool = False) -> dict:
+        """
+        Get data on a command from the database.
+
+        Parameters
+        ----------------
+        command_name: :class:`int`
+            Name of the command
+        insert: Optional[:class:`bool`]
+            If True, command data will be inserted into the database.
+
+        Returns
+        -------
+        :class:`dict`
+            The command data.
+        """
+        command_data = await self.commands.find_one({"command_name": command_name})
+        if command_data is None:
+            command_data = {
+                "command_name": command_name,
+                "disabled": 0,
+            }
+            if insert:
+                await self.commands.insert_one(command_data)
+
+        return command_data
+
+    async def get_daily_debates(self, guild_id: int) -> dict:
+        """
+        Get daily debates data of a guild.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild.
+
+        Returns
+        -------
+        :class:`dict`
+            The daily debate data.
+        """
+        daily_debates = await self.daily_debates.find_one({"guild_id": guild_id})
+        if not daily_debates:
+            daily_debates = copy.deepcopy(schemas["daily_debates"])
+            daily_debates["guild_id"] = guild_id
+            await self.daily_debates.insert_one(daily_debates)
+
+        return daily_debates
+
+    async def get_automember(self, guild_id: int) -> bool:
+        """
+        Get automember setting of guild.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild.
+
+        Returns
+        -------
+        :class:`bool`
+            True if automember is enabled, False if not.
+        """
+        leveling_data = await self.get_leveling_data(guild_id, {"automember": 1})
+        if not leveling_data or "automember" not in leveling_data:
+            await self.leveling_data.update_one(
+                {"guild_id": guild_id}, {"$set": {"automember": False}}
+            )
+            automember = False
+        else:
+            automember = leveling_data["automember"]
+
+        return automember
+
+    async def get_cases(self, guild_id: int, **kwargs) -> list:
+        """
+        Get cases based on given kwargs.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+           ID of the guild.
+        kwargs: :class:`dict`
+           Different values to search for cases by.
+
+        Returns
+        -------
+        :class:`list`
+           All the found cases.
+        """
+        query = {"guild_id": guild_id, **kwargs}
+        return await self.cases.find(query).sort("created_at", 1).to_list(length=None)
+
+    async def add_case_logs(self, case_id: ObjectId, logs_url: str):
+        """
+        Set the logs url for a case.
+
+        Parameters
+        ___________
+        case_id: :class:`ObjectId`
+           ID of the case.
+        logs_url: :class:`str`
+           url of the logs.
+        """
+        await self.cases.update_one({"_id": case_id}, {"$set": {"logs_url": logs_url}})
+
+    async def add_task(self, function: str, **kwargs):
+        """
+        Queue a task to be run by the bot.
+
+        Parameters
+        ___________
+        function: :class:`str`
+           Name of the function in :class:`modules.tasks.Tasks` that will be called.
+        **kwargs:
+           Keyword arguments the function will be called with.
+        """
+        task = copy.deepcopy(schemas["task"])
+        task.update({"function": function, "kwargs": kwargs, "created_at": time.time()})
+        await self.tasks.insert_one(task)
+
 
 def get_connection():
     """
@@ -606,6 +884,19 @@ def get_connection():
     return active_connection
 
 
+def get_async_connection():
+    """
+    Set the global connection variable active_async_connection to an :class:`AsyncConnection`.
+    If it's already set, it returns active_async_connection.
+    """
+
+    global active_async_connection
+    if active_async_connection is None:
+        active_async_connection = AsyncConnection()
+
+    return active_async_connection
+
+
 schemas = {
     "leveling_user": {
         "pp": 0,  # Participation points or parliamentary points
@@ -641,4 +932,11 @@ schemas = {
         "time": 0,
         "topics": [],
     },
+    "task": {
+        "function": "",
+        "kwargs": {},
+        "attempts": 0,
+        "lease_expires": 0,
+        "created_at": 0,
+    },
 }
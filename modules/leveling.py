@@ -1,18 +1,468 @@
 from __future__ import annotations
 
+import asyncio
 import math
 import time
+from bisect import bisect_right
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Optional, Tuple, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 import config
 import discord
+from pymongo import UpdateOne
 from pymongo.collection import Collection
+from sortedcontainers import SortedList
 
-from modules import database
-from modules.utils import get_guild_role, get_member_by_id
+from modules import database, timers
+from modules.utils import get_guild_role, get_member_by_id, get_logger
 
 db = database.get_connection()
+async_db = database.get_async_connection()
+
+# cumulative points needed to reach a level, index is the level, extended as needed by points_level
+level_points_table = [0]
+
+
+def level_points(level: Union[int, float]) -> int:
+    """
+    Get the total amount of points needed to reach a level.
+
+    Parameters
+    ----------------
+    level: Union[:class:`int`, :class:`float`]
+        The level.
+
+    Returns
+    -------
+    :class:`int`
+        The total amount of points.
+    """
+    if type(level) == int and 0 <= level < len(level_points_table):
+        return level_points_table[level]
+
+    return round(5 / 6 * level * (2 * level * level + 27 * level + 91))
+
+
+def points_level(points: int) -> int:
+    """
+    Get the level a user has with the given amount of points, looked up with bisect from :data:`level_points_table`.
+
+    Parameters
+    ----------------
+    points: :class:`int`
+        The amount of points.
+
+    Returns
+    -------
+    :class:`int`
+        The highest level whose total points are smaller than or equal to points.
+    """
+    # grow the table until it covers the points, doubling the levels so this happens rarely
+    while level_points_table[-1] <= points:
+        for level in range(len(level_points_table), 2 * len(level_points_table) + 1):
+            level_points_table.append(level_points(level))
+
+    return bisect_right(level_points_table, points) - 1
+
+
+def role_index_for_level(level: int, role_count: int) -> int:
+    """Get the index of the role a user should have at level, every 5 levels user advances a role."""
+    return max(min(math.ceil(level / 5) - 1, role_count - 1), 0)
+
+
+class LevelingWriteBuffer:
+    """
+    Write-behind buffer for the leveling_users collection.
+
+    Updates are coalesced per (guild_id, user_id) and written with a single ordered `bulk_write` when :func:`flush` is called.
+    Updates which touch the same or overlapping fields with different operators, like `$unset` on `boosts.rep` followed by
+    `$set` on `boosts.rep.expires`, are kept as separate operations so the order is preserved.
+
+    Attributes
+    ---------------
+    collection: :class:`motor.motor_asyncio.AsyncIOMotorCollection`
+        The collection the updates will be written to.
+    max_pending: :class:`int`
+        How many members can have unflushed updates, before a flush is started without waiting for the flush loop.
+    max_buffered: :class:`int`
+        The most members that can have unflushed updates, updates of other members are dropped until a flush succeeds,
+        so the buffer can't grow without limit while the database is down.
+    pending: :class:`dict`
+        Dictionary of (guild_id, user_id) to list of update documents waiting to be written.
+    flushing: :class:`dict`
+        The pending updates which are currently being written.
+    flush_task: Optional[:class:`asyncio.Task`]
+        The flush started by :func:`start_flush`, a new one isn't started while it's running.
+    dropped: :class:`int`
+        How many updates have been dropped since the last successful flush.
+    """
+
+    def __init__(self, collection, *, max_pending: int = 500, max_buffered: int = 50000):
+        self.collection = collection
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.pending = {}
+        self.flushing = {}
+        self.flush_task = None
+        self.dropped = 0
+        self.lock = asyncio.Lock()
+        self.logger = get_logger()
+
+    def __len__(self):
+        return len(self.pending)
+
+    @staticmethod
+    def _conflicts(current: dict, update: dict) -> bool:
+        """Check if update can't be merged into the current update document."""
+        for operator, fields in update.items():
+            for path in fields:
+                for current_operator, current_fields in current.items():
+                    for current_path in current_fields:
+                        if path == current_path and operator != current_operator:
+                            return True
+                        if path.startswith(f"{current_path}.") or current_path.startswith(f"{path}."):
+                            return True
+
+        return False
+
+    def is_dirty(self, guild_id: int, user_id: int) -> bool:
+        """Check if user has updates which haven't been written to the database yet."""
+        key = (guild_id, user_id)
+        return key in self.pending or key in self.flushing
+
+    def update(self, guild_id: int, user_id: int, update: dict):
+        """
+        Queue an update for a leveling user.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild.
+        user_id: :class:`int`
+            ID of the user.
+        update: :class:`dict`
+            The update document, only `$set` and `$unset` are supported, since they are safe to retry.
+        """
+        key = (guild_id, user_id)
+        if key not in self.pending and len(self.pending) >= self.max_buffered:
+            if not self.dropped:
+                self.logger.error(f"Leveling write buffer is full with {len(self.pending)} members, dropping updates until a flush succeeds")
+            self.dropped += 1
+            return
+
+        updates = self.pending.setdefault(key, [{}])
+        if self._conflicts(updates[-1], update):
+            updates.append({})
+
+        for operator, fields in update.items():
+            updates[-1].setdefault(operator, {}).update(fields)
+
+        if len(self.pending) >= self.max_pending:
+            self.start_flush()
+
+    def start_flush(self):
+        """Start a flush in the background, unless the previous one started by this is still running."""
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Write all the pending updates to the database."""
+        # only one flush can be writing at a time, otherwise newer updates could be written before older ones
+        async with self.lock:
+            if not self.pending:
+                return
+
+            pending, self.pending = self.pending, {}
+            self.flushing = pending
+            requests = [
+                UpdateOne({"guild_id": guild_id, "user_id": user_id}, update)
+                for (guild_id, user_id), updates in pending.items()
+                for update in updates
+            ]
+
+            try:
+                await self.collection.bulk_write(requests, ordered=True)
+                if self.dropped:
+                    self.logger.error(f"Leveling write buffer dropped {self.dropped} updates while it was full")
+                    self.dropped = 0
+            except Exception as e:
+                self.logger.exception(f"Failed to flush {len(requests)} leveling updates: {e}")
+                # updates are only $set and $unset, so it's safe to retry them before any newer updates
+                for key, updates in pending.items():
+                    self.pending[key] = updates + self.pending.get(key, [])
+            finally:
+                self.flushing = {}
+
+
+write_buffer = LevelingWriteBuffer(async_db.leveling_users)
+
+
+class RoleAssignmentQueue:
+    """
+    Queue for the roles given to members by the leveling system.
+
+    Roles for the same member are deduplicated and merged, so all of them are given with a single member edit
+    when :func:`process` is called. Members are processed one at a time with :attr:`delay` seconds between them,
+    which keeps the requests inside the guild's rate limit bucket instead of bursting them.
+
+    Attributes
+    ---------------
+    pending: :class:`dict`
+        Dictionary of (guild_id, member_id) to (member, dictionary of role id to role) waiting to be given.
+    delay: :class:`float`
+        How many seconds to wait between member edits.
+    """
+
+    def __init__(self, *, delay: float = 0.5):
+        self.pending = {}
+        self.delay = delay
+        self.logger = get_logger()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, member: discord.Member, *roles: discord.Role):
+        """
+        Queue roles to be given to a member, roles the member already has are ignored.
+
+        Parameters
+        ----------------
+        member: :class:`discord.Member`
+            The member.
+        *roles: :class:`discord.Role`
+            The roles that will be given to the member.
+        """
+        member_role_ids = {role.id for role in member.roles}
+        missing_roles = [role for role in roles if role and role.id not in member_role_ids]
+        if not missing_roles:
+            return
+
+        _, queued_roles = self.pending.setdefault((member.guild.id, member.id), (member, {}))
+        for role in missing_roles:
+            queued_roles[role.id] = role
+
+    async def process(self):
+        """Give all the queued roles, one edit per member."""
+        pending, self.pending = self.pending, {}
+        for queued_member, roles in pending.values():
+            # the queued member object might be stale, or the member might've left while the roles were queued
+            member = queued_member.guild.get_member(queued_member.id)
+            if member is None:
+                continue
+
+            # roles might've been given by something else while they were queued
+            member_role_ids = {role.id for role in member.roles}
+            roles = [role for role_id, role in roles.items() if role_id not in member_role_ids]
+            if not roles:
+                continue
+
+            try:
+                await member.add_roles(*roles, atomic=False)
+            except (discord.Forbidden, discord.NotFound):
+                # member has left or the bot can't give the roles, retrying won't help
+                pass
+            except discord.HTTPException as e:
+                self.logger.exception(f"Failed to give roles to {member} [{member.id}]: {e}")
+                self.add(member, *roles)
+
+            await asyncio.sleep(self.delay)
+
+
+role_queue = RoleAssignmentQueue()
+
+
+class Leaderboard:
+    """
+    Order-statistics index of the users on a branch, sorted by points from highest to lowest.
+
+    Kept up to date by :class:`LevelingUserBranch` and :class:`LevelingUser` when points change,
+    so ranks and leaderboard pages can be looked up in O(log n) without querying the database.
+
+    Attributes
+    ---------------
+    points: :class:`dict`
+        Dictionary of user id to the amount of points the user has.
+    sorted_users: :class:`sortedcontainers.SortedList`
+        List of (-points, user_id) tuples.
+    """
+
+    def __init__(self, users: dict = None):
+        self.points = dict(users) if users else {}
+        self.sorted_users = SortedList(
+            (-points, user_id) for user_id, points in self.points.items()
+        )
+
+    def __len__(self):
+        """Amount of users who have more than 0 points, those are the only ones shown in the leaderboard."""
+        return self.sorted_users.bisect_left((0,))
+
+    def update(self, user_id: int, points: int):
+        """Set the points of a user, adding the user to the index if needed."""
+        if self.points.get(user_id) == points:
+            return
+
+        self.remove(user_id)
+        self.points[user_id] = points
+        self.sorted_users.add((-points, user_id))
+
+    def remove(self, user_id: int):
+        """Remove user from the index."""
+        points = self.points.pop(user_id, None)
+        if points is not None:
+            self.sorted_users.remove((-points, user_id))
+
+    def rank(self, user_id: int) -> int:
+        """
+        Get the rank of a user, which is the amount of users who have the same or more points than the user.
+
+        Parameters
+        ----------------
+        user_id: :class:`int`
+            ID of the user.
+
+        Returns
+        -------
+        :class:`int`
+            The rank of the user.
+        """
+        points = self.points.get(user_id, 0)
+        return self.sorted_users.bisect_right((-points, math.inf))
+
+    def position(self, user_id: int) -> int:
+        """
+        Get the index of the user in the leaderboard.
+
+        Returns
+        -------
+        :class:`int`
+            The index of the user or the length of the leaderboard if user isn't in it.
+        """
+        points = self.points.get(user_id, 0)
+        if points <= 0:
+            return len(self)
+
+        return self.sorted_users.index((-points, user_id))
+
+    def slice(self, start: int, stop: int) -> List[int]:
+        """Get the ids of the users between indexes start and stop in the leaderboard."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+
+        return [user_id for _, user_id in self.sorted_users.islice(max(start, 0), stop)]
+
+    def page(self, page: int, page_size: int) -> List[int]:
+        """Get the ids of the users on a leaderboard page, pages start from 1."""
+        return self.slice(page_size * (page - 1), page_size * page)
+
+
+class LevelingMemberCache:
+    """
+    Bounded cache of :class:`LevelingMember` objects, ordered from least to most recently used.
+
+    Members are evicted when the cache is over :attr:`maxsize` or when they haven't been used in :attr:`ttl` seconds.
+    If an evicted member still has updates in the write buffer, a flush is started so the updates aren't left waiting.
+
+    Attributes
+    ---------------
+    guild_id: :class:`int`
+        ID of the guild the members belong to.
+    maxsize: :class:`int`
+        The maximum amount of members kept in the cache.
+    ttl: :class:`float`
+        How many seconds an unused member is kept in the cache.
+    entries: :class:`collections.OrderedDict`
+        Dictionary of member id to (LevelingMember, expires) tuple.
+    hits: :class:`int`
+        How many lookups have found the member in the cache.
+    misses: :class:`int`
+        How many lookups haven't found the member in the cache.
+    evictions: :class:`int`
+        How many members have been evicted from the cache.
+    """
+
+    def __init__(self, guild_id: int, *, maxsize: int = None, ttl: float = None):
+        self.guild_id = guild_id
+        self.maxsize = maxsize or config.LEVELING_MEMBER_CACHE_SIZE
+        self.ttl = ttl or config.LEVELING_MEMBER_CACHE_TTL
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        yield from (leveling_member for leveling_member, _ in self.entries.values())
+
+    def __contains__(self, member_id: int):
+        return member_id in self.entries
+
+    def get(self, member_id: int) -> Optional[LevelingMember]:
+        """
+        Get member from the cache and mark it as the most recently used.
+
+        Parameters
+        ----------------
+        member_id: :class:`int`
+            ID of the member.
+
+        Returns
+        -------
+        Optional[:class:`LevelingMember`]
+            The LevelingMember or `None` if member isn't in the cache or has expired.
+        """
+        entry = self.entries.get(member_id)
+        now = time.monotonic()
+        if entry is None or entry[1] < now:
+            if entry is not None:
+                self.evict(member_id)
+
+            self.misses += 1
+            return None
+
+        self.entries[member_id] = (entry[0], now + self.ttl)
+        self.entries.move_to_end(member_id)
+        self.hits += 1
+        return entry[0]
+
+    def add(self, leveling_member: LevelingMember):
+        """Add member to the cache and evict expired and least recently used members if needed."""
+        now = time.monotonic()
+        self.entries[leveling_member.id] = (leveling_member, now + self.ttl)
+        self.entries.move_to_end(leveling_member.id)
+
+        # entries are ordered by last use, so all the expired ones are at the start
+        while self.entries:
+            oldest_id, (_, expires) = next(iter(self.entries.items()))
+            if len(self.entries) <= self.maxsize and expires >= now:
+                break
+
+            self.evict(oldest_id)
+
+    def evict(self, member_id: int):
+        """Remove member from the cache, starting a flush if the member has unwritten updates."""
+        if self.entries.pop(member_id, None) is None:
+            return
+
+        self.evictions += 1
+        if write_buffer.is_dirty(self.guild_id, member_id):
+            write_buffer.start_flush()
+
+    def stats(self) -> dict:
+        """Returns the size and hit/miss counters of the cache in the form of a dictionary."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0,
+        }
 
 
 class DatabaseList(list):
@@ -32,16 +482,31 @@ class DatabaseList(list):
         Key used in database queries when setting value.
     *args:
         Initial values that will be set in the list.
+    on_change: Optional[Callable]
+        Function called after the list has been changed, used to invalidate anything built from the list.
     """
 
-    def __init__(self, collection: Collection, query_filter: dict, key: str, *args):
+    def __init__(
+        self,
+        collection: Collection,
+        query_filter: dict,
+        key: str,
+        *args,
+        on_change: Callable = None,
+    ):
         self.collection = collection
         self.query_filter = query_filter
         self.key = key
+        self.on_change = on_change
 
         super().__init__()
         self.extend(list(args))
 
+    def changed(self):
+        """Call :attr:`on_change` if it is set."""
+        if self.on_change:
+            self.on_change()
+
     def __delitem__(self, index: int):
         """Hard to implement, so it will raise exception."""
         raise Exception("Del operation not allowed on DatabaseList")
@@ -58,7 +523,8 @@ class DatabaseList(list):
                 }
             },
         )
-        super()[index] = value
+        super().__setitem__(index, value)
+        self.changed()
 
     def insert(self, index: int, value):
         """Hard to implement, so it will raise exception."""
@@ -75,6 +541,7 @@ class DatabaseList(list):
             },
         )
         super().append(item)
+        self.changed()
 
     def remove(self, item) -> None:
         """Method that removes item from list and database list."""
@@ -87,6 +554,7 @@ class DatabaseList(list):
             },
         )
         super().remove(item)
+        self.changed()
 
 
 class Boost:
@@ -107,6 +575,8 @@ class Boost:
         Time when boost expires - unix epoch.
     """
 
+    __slots__ = ("leveling_member", "boost_type", "multiplier", "expires")
+
     def __init__(self, leveling_member: LevelingMember, boost_type: str, boost: dict):
         self.leveling_member = leveling_member
         self.boost_type = boost_type
@@ -126,11 +596,9 @@ class Boost:
 
     def remove(self):
         """Delete boost from the database."""
-        db.leveling_users.update_one(
-            {
-                "guild_id": self.leveling_member.guild.id,
-                "user_id": self.leveling_member.id,
-            },
+        write_buffer.update(
+            self.leveling_member.guild.id,
+            self.leveling_member.id,
             {"$unset": {f"boosts.{self.boost_type}": 1}},
         )
 
@@ -142,17 +610,15 @@ class Boost:
         """For some variables, changing their value will also edit the entry in the database."""
         if (
             key in ["multiplier", "expires"]
-            and key in self.__dict__
-            and self.__dict__[key] != value
+            and hasattr(self, key)
+            and getattr(self, key) != value
         ):
-            db.leveling_users.update_one(
-                {
-                    "guild_id": self.leveling_member.guild.id,
-                    "user_id": self.leveling_member.id,
-                },
+            write_buffer.update(
+                self.leveling_member.guild.id,
+                self.leveling_member.id,
                 {"$set": {f"boosts.{self.boost_type}.{key}": value}},
             )
-        self.__dict__[key] = value
+        super().__setattr__(key, value)
 
 
 class LevelingUserBoosts:
@@ -169,6 +635,8 @@ class LevelingUserBoosts:
         The daily debate boost a user can have.
     """
 
+    __slots__ = ("leveling_member", "rep", "daily_debate")
+
     def __init__(self, leveling_member: LevelingMember, boosts: dict):
         self.leveling_member = leveling_member
         self.rep = Boost(leveling_member, "rep", boosts.get("rep", {}))
@@ -218,20 +686,18 @@ class LevelingUserBoosts:
         """For some variables, changing their value will also edit the entry in the database."""
         if (
             key in ["rep", "daily_debate"]
-            and key in self.__dict__
-            and self.__dict__[key] != value
+            and hasattr(self, key)
+            and getattr(self, key) != value
             and type(value) == Boost
         ):
             db_value = value.values()
-            db.leveling_users.update_one(
-                {
-                    "guild_id": self.leveling_member.guild.id,
-                    "user_id": self.leveling_member.id,
-                },
+            write_buffer.update(
+                self.leveling_member.guild.id,
+                self.leveling_member.id,
                 {"$set": {f"boosts.{key}": db_value}},
             )
 
-        self.__dict__[key] = value
+        super().__setattr__(key, value)
 
 
 class LevelingUserSettings:
@@ -250,6 +716,8 @@ class LevelingUserSettings:
         The rep@ setting, if True, after a user gives a rep to someone, a timer will be started to @ them when the timer is over.
     """
 
+    __slots__ = ("leveling_member", "at_me", "rep_at")
+
     def __init__(self, leveling_member: LevelingMember, settings: dict):
         self.leveling_member = leveling_member
         self.at_me = settings.get("@_me", False)
@@ -258,22 +726,18 @@ class LevelingUserSettings:
     def toggle_at_me(self):
         """Toggle @me setting."""
         self.at_me = not bool(self.at_me)
-        db.leveling_users.update_one(
-            {
-                "guild_id": self.leveling_member.guild.id,
-                "user_id": self.leveling_member.id,
-            },
+        write_buffer.update(
+            self.leveling_member.guild.id,
+            self.leveling_member.id,
             {"$set": {"settings.@_me": self.at_me}},
         )
 
     def toggle_rep_at(self):
         """Toggle rep@ setting."""
         self.rep_at = not bool(self.rep_at)
-        db.leveling_users.update_one(
-            {
-                "guild_id": self.leveling_member.guild.id,
-                "user_id": self.leveling_member.id,
-            },
+        write_buffer.update(
+            self.leveling_member.guild.id,
+            self.leveling_member.id,
             {"$set": {"settings.rep@": self.rep_at}},
         )
 
@@ -296,6 +760,8 @@ class LevelingUserBranch:
         The role the user has on the branch.
     """
 
+    __slots__ = ("leveling_member", "branch", "points", "level", "role")
+
     def __init__(
         self,
         leveling_member: LevelingMember,
@@ -314,23 +780,26 @@ class LevelingUserBranch:
         """For some variables, changing their value will also edit the entry in the database."""
         if (
             key in ["points", "level", "role"]
-            and key in self.__dict__
-            and self.__dict__[key] != value
+            and hasattr(self, key)
+            and getattr(self, key) != value
         ):
             key_switch = {
                 "points": f"{self.branch.name[0]}p",
                 "level": f"{self.branch.name[0]}_level",
                 "role": f"{self.branch.name[0]}_role",
             }
-            db.leveling_users.update_one(
-                {
-                    "guild_id": self.leveling_member.guild.id,
-                    "user_id": self.leveling_member.id,
-                },
+            write_buffer.update(
+                self.leveling_member.guild.id,
+                self.leveling_member.id,
                 {"$set": {key_switch.get(key): value}},
             )
 
-        self.__dict__[key] = value
+            if key == "points":
+                self.leveling_member.guild.leaderboards[self.branch.name].update(
+                    self.leveling_member.id, value
+                )
+
+        super().__setattr__(key, value)
 
 
 class LevelingUser:
@@ -359,6 +828,18 @@ class LevelingUser:
         Represents all the boosts user can have.
     """
 
+    __slots__ = (
+        "leveling_member",
+        "parliamentary",
+        "honours",
+        "settings",
+        "reputation",
+        "rp",
+        "last_rep",
+        "rep_timer",
+        "boosts",
+    )
+
     def __init__(self, leveling_member: LevelingMember, leveling_user_data: dict):
         self.leveling_member = leveling_member
 
@@ -428,18 +909,22 @@ class LevelingUser:
         """For some variables, changing their value will also edit the entry in the database."""
         if (
             key in ["rp", "rep_timer", "last_rep"]
-            and key in self.__dict__
-            and self.__dict__[key] != value
+            and hasattr(self, key)
+            and getattr(self, key) != value
         ):
-            db.leveling_users.update_one(
-                {
-                    "guild_id": self.leveling_member.guild.id,
-                    "user_id": self.leveling_member.id,
-                },
+            write_buffer.update(
+                self.leveling_member.guild.id,
+                self.leveling_member.id,
                 {"$set": {key: value}},
             )
 
-        self.__dict__[key] = value
+            if key == "rp":
+                object.__setattr__(self.reputation, "points", value)
+                self.leveling_member.guild.leaderboards["reputation"].update(
+                    self.leveling_member.id, value
+                )
+
+        super().__setattr__(key, value)
 
 
 class LevelingRole:
@@ -456,6 +941,8 @@ class LevelingRole:
         The name of the role.
     name: :class:`list`
         List of the perks the role has to offer.
+    guild_role: Optional[:class:`discord.Role`]
+        The cached guild role object, resolved by :func:`get_guild_role` and reset when guild roles change.
     """
 
     def __init__(
@@ -473,6 +960,7 @@ class LevelingRole:
             f"leveling_routes.{self.name}.$.perks",
             *leveling_role.get("perks", []),
         )
+        self.guild_role = None
 
     def values(self):
         """Returns info in the form of a dictionary."""
@@ -487,12 +975,15 @@ class LevelingRole:
         :class:`discord.Role`
             The discord role.
         """
-        # TODO: maybe cache this value?
+        if self.guild_role is not None:
+            return self.guild_role
+
         role = await get_guild_role(self.guild, self.name)
         # if role doesnt exist, create it
         if role is None:
             role = await self.guild.create_role(name=self.name)
 
+        self.guild_role = role
         return role
 
     def __setattr__(self, key, value):
@@ -517,8 +1008,14 @@ class LevelingRole:
             self.__dict__[key].list = value
             return
 
+        renamed = key == "name" and "guild_role" in self.__dict__
         self.__dict__[key] = value
 
+        # role needs to be found by its new name
+        if renamed:
+            self.guild_role = None
+            self.branch.index_roles()
+
 
 class LevelingRoute:
     """
@@ -532,17 +1029,31 @@ class LevelingRoute:
         The name of the leveling route.
     roles: :class:`DatabaseList`
         List of roles in the route.
+    role_index: :class:`dict`
+        Dictionary of lowercase role name to (position, :class:`LevelingRole`), rebuilt when :attr:`roles` changes.
     """
 
     def __init__(self, guild: discord.Guild, name: str, roles: list):
         self.guild = guild
         self.name = name
+        self.role_index = {}
         self.roles = DatabaseList(
             db.leveling_data,
             {"guild_id": self.guild.id},
             f"leveling_routes.{self.name}",
             *[LevelingRole(guild, self, role) for role in roles],
+            on_change=self.index_roles,
         )
+        self.index_roles()
+
+    def index_roles(self):
+        """Rebuild :attr:`role_index` from :attr:`roles`."""
+        role_index = {}
+        for position, role in enumerate(self.roles):
+            # keep the first role if there are duplicate names, same as a linear search would
+            role_index.setdefault(role.name.lower(), (position, role))
+
+        self.role_index = role_index
 
     def find_role(self, role_name: str) -> Optional[LevelingRole]:
         """
@@ -558,9 +1069,28 @@ class LevelingRoute:
         Optional[:class:`LevelingRole`]
             The LevelingRole or `None` if it isn't found.
         """
-        for role in self.roles:
-            if role.name.lower() == role_name.lower():
-                return role
+        position, role = self.role_index.get(role_name.lower(), (None, None))
+        return role
+
+    def role_position(self, role: LevelingRole) -> int:
+        """
+        Get the position of a role in :attr:`roles`.
+
+        Parameters
+        ----------------
+        role: :class:`LevelingRole`
+            The role.
+
+        Returns
+        -------
+        :class:`int`
+            The position of the role.
+        """
+        position, _ = self.role_index.get(role.name.lower(), (None, None))
+        if position is None or self.roles[position] is not role:
+            return self.roles.index(role)
+
+        return position
 
     def __iter__(self):
         """Iterator magic method to loop over the LevelingRoute's roles."""
@@ -592,6 +1122,8 @@ class LevelingRoutes:
             guild, "honours", leveling_routes.get("honours", [])
         )
         self.reputation = LevelingRoute(guild, "reputation", [])  # need in some places
+        # since all the branches have unique names, they can be searched by their first character
+        self.routes = {"p": self.parliamentary, "h": self.honours}
 
     def get_leveling_role(self, role_name: str) -> LevelingRole:
         """
@@ -612,6 +1144,20 @@ class LevelingRoutes:
             if role:
                 return role
 
+    def get_route(self, name: str) -> Optional[LevelingRoute]:
+        """Get :class:`LevelingRoute` by it's name or first character of it's name."""
+        return self.routes.get(name[0])
+
+    def index_guild_roles(self):
+        """Resolve the guild role of every :class:`LevelingRole` from a single pass over the guild's roles."""
+        guild_roles = {}
+        for role in self.guild.roles:
+            guild_roles.setdefault(role.name, role)
+
+        for branch in self:
+            for leveling_role in branch.roles:
+                leveling_role.guild_role = guild_roles.get(leveling_role.name)
+
     def __iter__(self) -> List[LevelingRoute]:
         """Iter magic method so when an instance of this class is looped over, it'll loop over the list of available branches."""
         yield from [self.parliamentary, self.honours]
@@ -689,20 +1235,134 @@ class LevelingGuild(LevelingData):
         The discord guild object.
     id: :class:`int`
         The discord id of the guild.
-    members :class:`List[:class:`LevelingMember`]`
-        List of LevelingMembers that belong to this guild.
+    members :class:`LevelingMemberCache`
+        Cache of the LevelingMembers that belong to this guild.
+    leaderboards :class:`dict`
+        Dictionary of branch name to the :class:`Leaderboard` of that branch.
     """
 
     # TODO: remove user function
-    def __init__(self, bot, guild: discord.Guild):
+    def __init__(self, bot, guild: discord.Guild, leveling_data: dict):
         self.bot = bot
         self.guild = guild
         self.id = guild.id
 
-        self.members = []
+        self.members = LevelingMemberCache(self.id)
+        self.leaderboards = {
+            "parliamentary": Leaderboard(),
+            "honours": Leaderboard(),
+            "reputation": Leaderboard(),
+        }
 
-        leveling_data = db.get_leveling_data(guild.id)
         super().__init__(guild, leveling_data)
+        self.leveling_routes.index_guild_roles()
+
+    async def load_leaderboards(self):
+        """Build the :attr:`leaderboards` from the points of all the leveling users in the guild."""
+        users = await async_db.leveling_users.find(
+            {"guild_id": self.id}, {"user_id": 1, "pp": 1, "hp": 1, "rp": 1}
+        ).to_list(length=None)
+
+        self.leaderboards = {
+            "parliamentary": Leaderboard({u["user_id"]: u.get("pp", 0) for u in users}),
+            "honours": Leaderboard({u["user_id"]: u.get("hp", 0) for u in users}),
+            "reputation": Leaderboard({u["user_id"]: u.get("rp", 0) for u in users}),
+        }
+
+    async def role_counts(self, branch: LevelingRoute) -> dict:
+        """
+        Count how many users with points on the branch have each role, with a single aggregation.
+
+        Parameters
+        ----------------
+        branch: :class:`LevelingRoute`
+            The branch.
+
+        Returns
+        -------
+        :class:`dict`
+            Dictionary of role name to the amount of users with the role.
+        """
+        await write_buffer.flush()
+
+        prefix = branch.name[0]
+        counts = await async_db.leveling_users.aggregate(
+            [
+                {"$match": {"guild_id": self.id, f"{prefix}p": {"$gt": 0}}},
+                {"$group": {"_id": f"${prefix}_role", "count": {"$sum": 1}}},
+            ]
+        ).to_list(length=None)
+
+        return {count["_id"]: count["count"] for count in counts}
+
+    async def recompute_levels(self, *, batch_size: int = 1000) -> int:
+        """
+        Recompute the levels and roles of all the leveling users in the guild from their points.
+
+        Users are read and written in batches of batch_size, only users whose level or role changed are updated.
+        Discord roles aren't touched, members are given their correct role the next time they level up.
+
+        Parameters
+        ----------------
+        batch_size: :class:`int`
+            How many users are processed in one batch.
+
+        Returns
+        -------
+        :class:`int`
+            The amount of users that were updated.
+        """
+        # make sure there are no buffered updates that would overwrite the recomputed values
+        await write_buffer.flush()
+
+        branches = [self.leveling_routes.parliamentary, self.leveling_routes.honours]
+        projection = {"user_id": 1, "pp": 1, "p_level": 1, "p_role": 1, "hp": 1, "h_level": 1, "h_role": 1}
+        cursor = async_db.leveling_users.find({"guild_id": self.id}, projection, batch_size=batch_size)
+
+        updated = 0
+        batch = []
+        async for leveling_user in cursor:
+            changes = {}
+            for branch in branches:
+                prefix = branch.name[0]
+                points = leveling_user.get(f"{prefix}p", 0)
+                level = points_level(points)
+                if level != leveling_user.get(f"{prefix}_level"):
+                    changes[f"{prefix}_level"] = level
+
+                # users without points don't have a role yet
+                if branch.roles and points > 0:
+                    role = branch.roles[role_index_for_level(level, len(branch.roles))].name
+                    if role != leveling_user.get(f"{prefix}_role"):
+                        changes[f"{prefix}_role"] = role
+
+            if not changes:
+                continue
+
+            batch.append(UpdateOne({"guild_id": self.id, "user_id": leveling_user["user_id"]}, {"$set": changes}))
+            self.update_cached_member(leveling_user["user_id"], changes)
+
+            if len(batch) >= batch_size:
+                await async_db.leveling_users.bulk_write(batch, ordered=False)
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            await async_db.leveling_users.bulk_write(batch, ordered=False)
+            updated += len(batch)
+
+        return updated
+
+    def update_cached_member(self, member_id: int, changes: dict):
+        """Apply changes that have already been written to the database to the cached LevelingMember, if there is one."""
+        if member_id not in self.members:
+            return
+
+        leveling_member = self.members.entries[member_id][0]
+        for key, value in changes.items():
+            user_branch = leveling_member.parliamentary if key[0] == "p" else leveling_member.honours
+            # bypass __setattr__ so the values aren't written to the database again
+            object.__setattr__(user_branch, key.split("_")[1], value)
 
     def get_leveling_role(self, role_name: str) -> LevelingRole:
         """
@@ -734,10 +1394,7 @@ class LevelingGuild(LevelingData):
         :class:`LevelingRole`
             The LevelingRoute or `None` if it isn't found.
         """
-        for branch in self.leveling_routes:
-            # since all the branches have unique names, search only by their first character
-            if branch.name[0] == name[0]:
-                return branch
+        return self.leveling_routes.get_route(name)
 
     async def get_member(self, member_id: int) -> Optional[LevelingMember]:
         """
@@ -753,12 +1410,7 @@ class LevelingGuild(LevelingData):
         Optional[:class:`LevelingRole`]
             The LevelingMember or `None` if member isn't in the guild.
         """
-        # try to get member from list of members
-        member = None
-        for _member in self.members:
-            if _member.id == member_id:
-                member = _member
-
+        member = self.members.get(member_id)
         if member is None:
             # try to get member from cache
             member = await get_member_by_id(self.guild, member_id)
@@ -777,16 +1429,35 @@ class LevelingGuild(LevelingData):
         ----------------
         member: :class:`discord.Member`
             The discord member.
+        leveling_user_data: Optional[:class:`dict`]
+            The member's leveling data, will be fetched from the database if not given.
 
         Returns
         -------
         :class:`LevelingMember`
             The LevelingMember.
         """
+        if not leveling_user_data:
+            # member might've been evicted from the cache with updates that haven't been written yet
+            if write_buffer.is_dirty(self.id, member.id):
+                await write_buffer.flush()
+
+            leveling_user_data = await async_db.get_leveling_user(self.id, member.id)
+
         leveling_member = LevelingMember(
             self.bot, self, member, leveling_user_data=leveling_user_data
         )
-        self.members.append(leveling_member)
+        self.members.add(leveling_member)
+
+        for user_branch in [
+            leveling_member.parliamentary,
+            leveling_member.honours,
+            leveling_member.reputation,
+        ]:
+            self.leaderboards[user_branch.branch.name].update(
+                leveling_member.id, user_branch.points
+            )
+
         return leveling_member
 
     def get_level_up_channel(self, message: discord.Message) -> discord.TextChannel:
@@ -829,13 +1500,15 @@ class LevelingMember(LevelingUser):
         The discord member object.
     """
 
+    __slots__ = ("bot", "guild", "id", "member")
+
     def __init__(
         self,
         bot,
         guild: LevelingGuild,
         member: discord.Member,
         *,
-        leveling_user_data: dict = None,
+        leveling_user_data: dict,
     ):
         self.bot = bot
         self.guild = guild
@@ -844,9 +1517,6 @@ class LevelingMember(LevelingUser):
         self.member = member
 
         # add leveling user data to this class
-        if not leveling_user_data:
-            leveling_user_data = db.get_leveling_user(member.guild.id, member.id)
-
         super().__init__(self, leveling_user_data)
 
     async def add_points(self, branch: Union[LevelingRoute, str], amount: int) -> None:
@@ -863,13 +1533,10 @@ class LevelingMember(LevelingUser):
         """
         patreon_role_id = 644182117051400220
         member_role_id = 662036345526419486
-        if self.guild.automember and patreon_role_id not in [
-            r.id for r in self.member.roles
-        ]:
-            member_role = discord.utils.find(
-                lambda r: r.id == member_role_id, self.guild.guild.roles
-            )
-            await self.member.add_roles(member_role)
+        if self.guild.automember and not any(
+            r.id == patreon_role_id for r in self.member.roles
+        ):
+            role_queue.add(self.member, self.guild.guild.get_role(member_role_id))
 
         if type(branch) == str:
             branch = self.guild.get_leveling_route(branch)
@@ -889,7 +1556,7 @@ class LevelingMember(LevelingUser):
 
     async def add_role(self, role: LevelingRole) -> discord.Role:
         """
-        Converts LevelingRole to guild role object and adds the role to the discord member.
+        Converts LevelingRole to guild role object and queues the role to be added to the discord member.
 
         Parameters
         ----------------
@@ -904,7 +1571,7 @@ class LevelingMember(LevelingUser):
         # get discord.Role role
         guild_role = await role.get_guild_role()
         # give role to user
-        await self.member.add_roles(guild_role)
+        role_queue.add(self.member, guild_role)
         return guild_role
 
     async def level_up(self, branch: LevelingRoute) -> Tuple[LevelingRole, int, int]:
@@ -930,15 +1597,14 @@ class LevelingMember(LevelingUser):
         # Checks if user has current role
         current_role = branch.find_role(user_branch.role)
         current_guild_role = await current_role.get_guild_role()
-        if current_guild_role not in self.member.roles:
-            await self.member.add_roles(current_guild_role)
+        role_queue.add(self.member, current_guild_role)
 
         # get user role level
         role_level = self.user_role_level(user_branch)
 
         # user needs to go up a role
         if role_level < 0:
-            role_index = branch.roles.index(current_role)
+            role_index = branch.role_position(current_role)
             new_role = (
                 branch.roles[-1]
                 if len(branch.roles) - 1 < role_index + abs(role_level)
@@ -1021,16 +1687,13 @@ class LevelingMember(LevelingUser):
             return 0  # return 0 if user's current role isn't listen in the branch
 
         all_roles = branch.roles
-        role_index = all_roles.index(user_role)
-
-        # + 1 includes current role
-        up_to_current_role = all_roles[: role_index + 1]
+        role_index = branch.role_position(user_role)
 
         # how many levels to reach current user role
-        current_level_total = 5 * len(up_to_current_role)
+        current_level_total = 5 * (role_index + 1)
 
         # how many levels to reach previous user role
-        previous_level_total = 5 * len(up_to_current_role[:-1])
+        previous_level_total = 5 * role_index
 
         # if user is on last role user level - how many levels it took to reach previous role
         # or if current level total is bigger than user level
@@ -1041,17 +1704,9 @@ class LevelingMember(LevelingUser):
         if current_level_total == user_branch.level:
             return 5
 
-        # if current level total is smaller than user level, user needs to rank up
-        if current_level_total < user_branch.level:
-            # calculates how many roles user goes up
-            roles_up = 0
-            # loop through roles above current user role
-            for _ in all_roles[role_index + 1 :]:
-                if current_level_total < user_branch.level:
-                    roles_up += 1
-                    current_level_total += 5
-
-            return -roles_up
+        # user needs to rank up, calculate how many roles user goes up, up to the last role
+        roles_up = math.ceil((user_branch.level - current_level_total) / 5)
+        return -min(roles_up, len(all_roles) - role_index - 1)
 
     @staticmethod
     def calculate_levels_up(user_branch: LevelingUserBranch) -> int:
@@ -1068,24 +1723,7 @@ class LevelingMember(LevelingUser):
         :class:`int`
             The number of levels LevelingMember needs to go up.
         """
-        user_levels = user_branch.level
-        user_points = user_branch.points
-
-        total_points = 0
-        total_levels_up = 0
-        while total_points <= user_points:
-            next_level = user_levels + total_levels_up + 1
-            # total points needed to gain the next level
-            total_points = round(
-                5
-                / 6
-                * next_level
-                * (2 * next_level * next_level + 27 * next_level + 91)
-            )
-
-            total_levels_up += 1
-
-        return total_levels_up - 1
+        return max(points_level(user_branch.points) - user_branch.level, 0)
 
     async def notify_perks(self, role: LevelingRole):
         """
@@ -1131,20 +1769,8 @@ class LevelingMember(LevelingUser):
         :class:`int`
             The rank of LevelingMember in user branch.
         """
-        key = f"{user_branch.branch.name[0]}p"
-        sorted_users = [
-            u
-            for u in db.leveling_users.find(
-                {
-                    "guild_id": self.guild.id,
-                    key: {
-                        "$gt": user_branch.points - 0.1
-                    },  # 0.1 is subtracted so member will be included
-                }
-            ).sort(key, -1)
-        ]
-
-        return len(sorted_users)
+        leaderboard = self.guild.leaderboards[user_branch.branch.name]
+        return leaderboard.rank(self.id)
 
     @staticmethod
     def percent_till_next_level(user_branch: LevelingUserBranch) -> float:
@@ -1161,14 +1787,11 @@ class LevelingMember(LevelingUser):
         :class:`float`
             The percent number, with one decimal point of how close user is to leveling up
         """
+        # total points needed to gain next level
+        total_points_to_next_level = level_points(user_branch.level + 1)
         # points needed to gain next level from beginning of user level
-        points_to_level_up = 5 * (user_branch.level ** 2) + 50 * user_branch.level + 100
+        points_to_level_up = total_points_to_next_level - level_points(user_branch.level)
 
-        next_level = user_branch.level + 1
-        # total points needed to gain next level
-        total_points_to_next_level = round(
-            5 / 6 * next_level * (2 * next_level * next_level + 27 * next_level + 91)
-        )
         points_needed = total_points_to_next_level - int(user_branch.points)
 
         percent = (
@@ -1188,64 +1811,144 @@ class LevelingSystem:
     ---------------
     bot: :class:`TLDR`
         The bot instance.
-    guilds: :class:`List[:class:`LevelingGuild`]`
-        List of the LevelingGuilds attached to the bot.
+    guilds: :class:`dict`
+        Dictionary of guild id to the LevelingGuilds attached to the bot.
+    write_buffer: :class:`LevelingWriteBuffer`
+        The buffer through which all the leveling user updates are written to the database.
+    role_queue: :class:`RoleAssignmentQueue`
+        The queue through which all the leveling roles are given to members.
     """
 
     def __init__(self, bot):
         self.bot = bot
-        # list of leveling guilds
-        self.guilds = []
+        # dict of guild id to leveling guild
+        self.guilds = {}
+        self.write_buffer = write_buffer
+        self.role_queue = role_queue
         self.bot.add_listener(self.on_message, "on_message")
         self.bot.add_listener(self.on_ready, "on_ready")
+        self.bot.add_listener(self.on_guild_role_update, "on_guild_role_update")
+        self.bot.add_listener(self.on_guild_role_change, "on_guild_role_create")
+        self.bot.add_listener(self.on_guild_role_change, "on_guild_role_delete")
         self.bot.logger.info("LevelingSystem module has been initiated")
 
     async def on_ready(self):
         await self.initialise_guilds()
         await self.check_left_members()
+        self.flush_writes.start()
+        self.assign_roles.start()
+        self.log_stats.start()
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.name != after.name:
+            await self.on_guild_role_change(after)
+
+    async def on_guild_role_change(self, role: discord.Role):
+        """Re-resolve the cached guild roles of the LevelingRoles when a guild role is created, deleted or renamed."""
+        leveling_guild = self.get_guild(role.guild.id)
+        if leveling_guild:
+            leveling_guild.leveling_routes.index_guild_roles()
+
+    @timers.loop(seconds=5)
+    async def flush_writes(self):
+        """Periodically write buffered leveling updates to the database."""
+        await self.write_buffer.flush()
+
+    @timers.loop(seconds=1)
+    async def assign_roles(self):
+        """Periodically give the queued leveling roles to members."""
+        await self.role_queue.process()
+
+    @timers.loop(minutes=30)
+    async def log_stats(self):
+        """Periodically log the stats of the LevelingMember caches and the point cooldowns, so they can be sized."""
+        for guild_id, stats in self.member_cache_stats().items():
+            self.bot.logger.info(f"Leveling member cache [{guild_id}]: {stats}")
 
-    async def check_left_members(self):
+        leveling_cog = self.bot.get_cog("Leveling")
+        if leveling_cog:
+            self.bot.logger.info(f"Leveling cooldowns: {leveling_cog.cooldown.stats()}")
+
+    async def check_left_members(self, *, batch_size: int = 1000):
         self.bot.logger.info(f"Checking Guilds for left members.")
         left_member_count = 0
         # check if any users have left while the bot was offline
         for guild in self.bot.guilds:
-            initial_left_members = left_member_count
-            guild_members = [
-                m.id for m in await guild.fetch_members(limit=None).flatten()
-            ]
-            leveling_users = db.leveling_users.find({"guild_id": guild.id})
-
-            self.bot.logger.debug(
-                f"Checking {guild.name} [{guild.id}] for left members. Guild members: {len(guild_members)} Leveling Users: {leveling_users.count()}"
-            )
-
-            for user in leveling_users:
+            guild_members = set()
+            async for member in guild.fetch_members(limit=None):
+                guild_members.add(member.id)
+
+            # only the ids are needed to find who has left
+            left_user_ids = []
+            leveling_user_count = 0
+            async for user in async_db.leveling_users.find(
+                {"guild_id": guild.id}, {"_id": 0, "user_id": 1}
+            ):
+                leveling_user_count += 1
                 # if true, user has left the server while the bot was offline
                 if int(user["user_id"]) not in guild_members:
-                    left_member_count += 1
-                    self.transfer_leveling_data(user)
+                    left_user_ids.append(user["user_id"])
 
             self.bot.logger.debug(
-                f"{left_member_count - initial_left_members} members left guild."
+                f"Checking {guild.name} [{guild.id}] for left members. Guild members: {len(guild_members)} Leveling Users: {leveling_user_count}"
             )
 
+            for i in range(0, len(left_user_ids), batch_size):
+                left_users = await async_db.leveling_users.find(
+                    {"guild_id": guild.id, "user_id": {"$in": left_user_ids[i:i + batch_size]}}
+                ).to_list(length=None)
+                await self.transfer_leveling_users(guild.id, left_users)
+
+            left_member_count += len(left_user_ids)
+            self.bot.logger.debug(f"{len(left_user_ids)} members left guild.")
+
         self.bot.left_check.set()
         self.bot.logger.info(
             f"Left members have been checked - Total {left_member_count} members left guilds."
         )
 
-    def transfer_leveling_data(self, leveling_user: dict):
-        db.leveling_users.delete_many(leveling_user)
-        db.left_leveling_users.delete_many(leveling_user)
-        db.left_leveling_users.insert_one(leveling_user)
+    async def transfer_leveling_data(self, leveling_user: dict):
+        await self.transfer_leveling_users(leveling_user["guild_id"], [leveling_user])
+
+    async def transfer_leveling_users(self, guild_id: int, leveling_users: List[dict]):
+        """
+        Move leveling users to left_leveling_users and create the timers for when their data expires.
+
+        Parameters
+        ----------------
+        guild_id: :class:`int`
+            ID of the guild the users have left.
+        leveling_users: List[:class:`dict`]
+            The leveling users' data.
+        """
+        if not leveling_users:
+            return
+
+        user_ids = [leveling_user["user_id"] for leveling_user in leveling_users]
+
+        leveling_guild = self.get_guild(guild_id)
+        if leveling_guild:
+            for leaderboard in leveling_guild.leaderboards.values():
+                for user_id in user_ids:
+                    leaderboard.remove(user_id)
+
+        query = {"guild_id": guild_id, "user_id": {"$in": user_ids}}
+        await async_db.leveling_users.delete_many(query)
+        await async_db.left_leveling_users.delete_many(query)
+        await async_db.left_leveling_users.insert_many(leveling_users)
 
         data_expires = round(time.time()) + 30 * 24 * 60 * 60  # 30 days
 
-        self.bot.timers.create(
-            guild_id=leveling_user["guild_id"],
-            expires=data_expires,
-            event="leveling_data_expires",
-            extras={"user_id": leveling_user["user_id"]},
+        await self.bot.timers.create_many(
+            [
+                {
+                    "guild_id": guild_id,
+                    "expires": data_expires,
+                    "event": "leveling_data_expires",
+                    "extras": {"user_id": user_id},
+                }
+                for user_id in user_ids
+            ]
         )
 
     async def on_message(self, message: discord.Message):
@@ -1272,7 +1975,7 @@ class LevelingSystem:
             f"Initialising {len(self.bot.guilds)} guilds as LevelingGuilds."
         )
         for guild in self.bot.guilds:
-            self.add_guild(guild)
+            await self.add_guild(guild)
 
     async def get_member(self, guild_id: int, member_id: int) -> LevelingMember:
         """
@@ -1308,11 +2011,20 @@ class LevelingSystem:
         :class:`LevelingGuild`
             The LevelingGuild or `None` if the LevelingGuild isn't found.
         """
-        for guild in self.guilds:
-            if guild.id == guild_id:
-                return guild
+        return self.guilds.get(guild_id)
+
+    def member_cache_stats(self) -> dict:
+        """
+        Get the stats of the LevelingMember caches, used for sizing the caches.
+
+        Returns
+        -------
+        :class:`dict`
+            Dictionary of guild id to the stats of :attr:`LevelingGuild.members`.
+        """
+        return {guild_id: guild.members.stats() for guild_id, guild in self.guilds.items()}
 
-    def add_guild(self, guild: discord.Guild) -> LevelingGuild:
+    async def add_guild(self, guild: discord.Guild) -> LevelingGuild:
         """
         Converts :class:`discord.Guild` to :class:`LevelingGuild` and adds it to :attr:`guilds`.
 
@@ -1329,6 +2041,8 @@ class LevelingSystem:
         self.bot.logger.debug(
             f"Adding guild {guild.name} [{guild.id}] to LevelingSystem."
         )
-        leveling_guild = LevelingGuild(self.bot, guild)
-        self.guilds.append(leveling_guild)
+        leveling_data = await async_db.get_leveling_data(guild.id)
+        leveling_guild = LevelingGuild(self.bot, guild, leveling_data)
+        await leveling_guild.load_leaderboards()
+        self.guilds[guild.id] = leveling_guild
         return leveling_guild
@@ -1,19 +1,26 @@
 import asyncio
+import collections
+import datetime
+import functools
 import re
 import time
+import aiohttp
 import discord
 import discord.utils
 import config
 
-from cachetools import TTLCache
+from cachetools import LRUCache, TTLCache
 from html import unescape
-from typing import Optional
-from modules import database
+from sortedcontainers import SortedList
+from typing import Awaitable, Callable, Hashable, Optional, Union
+from modules import database, timers
 from slack_bolt.app.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_sdk.errors import SlackApiError
 from modules.utils import replace_mentions, embed_message_to_text, async_file_downloader, get_member_from_string
 
 db = database.get_connection()
+async_db = database.get_async_connection()
 image_extensions = ['jpg', 'png', 'gif', 'webp', 'tiff', 'bmp', 'jpeg']
 
 
@@ -44,7 +51,7 @@ class SlackMessage:
 
         if self.channel is None:
             self.channel = SlackChannel(self.team, self.channel_id, self.slack)
-            self.team.channels.append(self.channel)
+            self.team.add_channel(self.channel)
 
         self.discord_message_id = event_data['discord_message_id'] if 'discord_message_id' in event_data else None
         self.reactions = {}
@@ -52,14 +59,14 @@ class SlackMessage:
         slack.bot.loop.create_task(self.initialise_data())
 
     async def initialise_data(self):
-        data = db.slack_messages.find_one({'slack_message_id': self.ts})
+        data = await async_db.slack_messages.find_one({'slack_message_id': self.ts})
         if not data:
-            db.slack_messages.insert_one({
+            await async_db.slack_messages.insert_one({
                 'team_id': self.team.team_id,
                 'slack_message_id': self.ts,
                 'discord_message_id': self.discord_message_id,
                 'origin': 'slack',
-                'timestamp': round(time.time())
+                'timestamp': datetime.datetime.utcnow()
             })
 
     def __setattr__(self, key, value):
@@ -68,9 +75,11 @@ class SlackMessage:
             and key in self.__dict__
             and self.__dict__[key] != value
         ):
-            db.slack_messages.update_one(
-                {"slack_message_id": self.ts},
-                {"$set": {f"{key}": value}},
+            self.slack.bot.loop.create_task(
+                async_db.slack_messages.update_one(
+                    {"slack_message_id": self.ts},
+                    {"$set": {f"{key}": value}},
+                )
             )
         self.__dict__[key] = value
 
@@ -81,7 +90,7 @@ class SlackMessage:
             if self.ts in self.team.slack_messages:
                 del self.team.slack_messages[self.ts]
 
-            db.slack_messages.delete_one({'slack_message_id': self.ts})
+            await async_db.slack_messages.delete_one({'slack_message_id': self.ts})
 
     async def replace_custom_mentions(self, string: str) -> str:
         if not self.channel.discord_channel:
@@ -123,11 +132,14 @@ class SlackMessage:
             self.member = await self.team.add_user(self.user_id)
 
         file_urls = [file['url'] for file in self.files]
+        files = await async_file_downloader(
+            file_urls,
+            headers={'Authorization': f'Bearer {self.team.token}'},
+            max_size=self.channel.discord_channel.guild.filesize_limit
+        )
         download_files = [
-            discord.File(file, filename=self.files[i]['name']) for i, file in
-            enumerate(
-                await async_file_downloader(file_urls, headers={'Authorization': f'Bearer {self.team.token}'})
-            )
+            discord.File(file, filename=self.files[i]['name'])
+            for i, file in enumerate(files) if file is not None
         ]
 
         text = unescape(self.text)
@@ -146,6 +158,7 @@ class SlackMessage:
 
         if not edit:
             self.discord_message_id = discord_message.id
+            self.team.message_links[self.ts] = self.discord_message_id
 
 
 class DiscordMessage:
@@ -165,22 +178,26 @@ class DiscordMessage:
         # self.reply_id = message.reference.message_id if message.reference else None
         # self.reply_is_bot = message.reference.resolved.author.bot if message.reference and type(message.reference.resolved) == discord.Message else None
 
+        # set when the message is deleted on discord, possibly before it has been sent to slack
+        self.deleted = False
+        # urls of the attachments already uploaded to slack, so a retried send doesn't upload them again
+        self.uploaded_urls = set()
         self.slack_message_id = None
-        self.initialise_data()
+        slack.bot.loop.create_task(self.initialise_data())
 
-    def initialise_data(self):
-        data = db.slack_messages.find_one({'discord_message_id': self.id})
+    async def initialise_data(self):
+        data = await async_db.slack_messages.find_one({'discord_message_id': self.id})
         if not data:
             slack_channel = self.slack.get_channel(discord_id=self.channel_id)
             if not slack_channel:
                 return
 
-            db.slack_messages.insert_one({
+            await async_db.slack_messages.insert_one({
                 'team_id': slack_channel.team.team_id,
                 'slack_message_id': self.slack_message_id,
                 'discord_message_id': self.id,
                 'origin': 'discord',
-                'timestamp': round(time.time())
+                'timestamp': datetime.datetime.utcnow()
             })
 
     def __setattr__(self, key, value):
@@ -189,13 +206,16 @@ class DiscordMessage:
             and key in self.__dict__
             and self.__dict__[key] != value
         ):
-            db.slack_messages.update_one(
-                {"discord_message_id": self.id},
-                {"$set": {f"{key}": value}},
+            self.slack.bot.loop.create_task(
+                async_db.slack_messages.update_one(
+                    {"discord_message_id": self.id},
+                    {"$set": {f"{key}": value}},
+                )
             )
         self.__dict__[key] = value
 
     async def delete(self):
+        self.deleted = True
         if self.slack_message_id:
             slack_channel = self.slack.get_channel(discord_id=self.channel_id)
             team = slack_channel.team
@@ -203,7 +223,7 @@ class DiscordMessage:
             if self.id in team.discord_messages:
                 del team.discord_messages[self.id]
 
-            db.slack_messages.delete_one({'team_id': team.team_id, 'discord_message_id': self.id})
+            await async_db.slack_messages.delete_one({'team_id': team.team_id, 'discord_message_id': self.id})
 
     def replace_custom_mentions(self, text: str) -> str:
         """
@@ -216,17 +236,11 @@ class DiscordMessage:
 
         team = slack_channel.team
 
-        special_chars_map = {i: '\\' + chr(i) for i in b'()[]{}?*+-|^$\\.&~#'}
         mentions = re.findall(r'(?:^|\s)(@.+)', text)
 
         def match_member(string: str):
-            safe_text = string.translate(special_chars_map)
-            members = list(
-                filter(
-                    lambda m: re.findall(fr'({safe_text.lower()})', m.name.lower()),
-                    team.members
-                )
-            )
+            # only need to know if there's none, one or more matches
+            members = [team.member_ids[slack_id] for slack_id in team.member_names.find(string, limit=2)]
             if len(members) == 1:
                 return members[0]
 
@@ -382,7 +396,7 @@ class DiscordMessage:
         return kwargs
 
     async def send_to_slack(self, edit: bool = False):
-        if edit and not self.slack_message_id:
+        if self.deleted or (edit and not self.slack_message_id):
             return
 
         slack_channel = self.slack.get_channel(discord_id=self.channel_id)
@@ -392,7 +406,8 @@ class DiscordMessage:
         kwargs = await self.to_slack_blocks()
         team = slack_channel.team
 
-        if kwargs['blocks'] and kwargs['text']:
+        # a retried send whose message was already posted only needs to upload the files
+        if kwargs['blocks'] and kwargs['text'] and (edit or not self.slack_message_id):
             kwargs.update({'channel': slack_channel.id})
             if edit:
                 kwargs['ts'] = self.slack_message_id
@@ -410,17 +425,88 @@ class DiscordMessage:
             if not edit:
                 slack_channel.team.discord_messages[self.id] = self
                 self.slack_message_id = slack_message['message']['ts']
-
-        if self.attachment_urls:
-            file_urls = [a for a in self.attachment_urls if a['url'].split('.')[-1] not in image_extensions]
+                slack_channel.team.message_links[self.id] = self.slack_message_id
+                # message was deleted on discord while it was being sent
+                if self.deleted:
+                    return await self.delete()
+
+        # attachments can't be added by editing a message, they're only uploaded with the send
+        if self.attachment_urls and not edit:
+            file_urls = [
+                a for a in self.attachment_urls
+                if a['url'].split('.')[-1] not in image_extensions and a['url'] not in self.uploaded_urls
+            ]
             files = await async_file_downloader([a['url'] for a in file_urls])
-            for i, file in enumerate(files):
-                await team.app.client.files_upload(
-                    file=file,
-                    filename=file_urls[i]['filename'],
-                    channels=slack_channel.id,
-                    initial_comment=f'Uploaded by: {self.author_name}'
-                )
+            try:
+                for i, file in enumerate(files):
+                    if file is None:
+                        continue
+
+                    await team.app.client.files_upload(
+                        file=file,
+                        filename=file_urls[i]['filename'],
+                        channels=slack_channel.id,
+                        initial_comment=f'Uploaded by: {self.author_name}'
+                    )
+                    self.uploaded_urls.add(file_urls[i]['url'])
+            finally:
+                # a failed upload leaves the rest of the files open
+                for file in files:
+                    if file is not None:
+                        file.close()
+
+
+class MemberNameIndex:
+    """
+    Sorted index of every suffix of lowercase member names, used for finding members whose name contains some text
+    with a bisect instead of matching the text against every member.
+
+    Attributes
+    ---------------
+    suffixes: :class:`sortedcontainers.SortedList`
+        Sorted list of (name suffix, slack id) tuples.
+    """
+    def __init__(self):
+        self.suffixes = SortedList()
+
+    def add(self, slack_id: str, name: str):
+        name = name.lower()
+        self.suffixes.update((name[i:], slack_id) for i in range(len(name)))
+
+    def remove(self, slack_id: str, name: str):
+        name = name.lower()
+        for i in range(len(name)):
+            self.suffixes.discard((name[i:], slack_id))
+
+    def find(self, text: str, *, limit: int = None) -> list[str]:
+        """
+        Find members whose name contains the text, case insensitive.
+
+        Parameters
+        ----------------
+        text: :class:`str`
+            The text.
+        limit: :class:`int`
+            Stop after this many members have been found.
+
+        Returns
+        -------
+        List[:class:`str`]
+            Slack ids of the members.
+        """
+        text = text.lower()
+        slack_ids = []
+        # suffixes starting with the text come right after the text in sorted order
+        for suffix, slack_id in self.suffixes.irange((text, '')):
+            if not suffix.startswith(text):
+                break
+
+            if slack_id not in slack_ids:
+                slack_ids.append(slack_id)
+                if len(slack_ids) == limit:
+                    break
+
+        return slack_ids
 
 
 class SlackMember:
@@ -442,6 +528,14 @@ class SlackMember:
 
         self.initialize_data()
 
+    def __setattr__(self, key, value):
+        # keep the team's discord id and name indexes up to date
+        if key == 'discord_member' and 'team' in self.__dict__ and self.team:
+            self.team.index_discord_member(self, self.__dict__.get(key), value)
+        elif key == 'name' and 'team' in self.__dict__ and self.team:
+            self.team.index_member_name(self, self.__dict__.get(key), value)
+        self.__dict__[key] = value
+
     def initialize_data(self):
         """Initialise slack user in the database if needed."""
         data = db.slack_bridge.find_one(
@@ -463,7 +557,7 @@ class SlackMember:
 
     async def get_discord_member(self):
         """Gets slack user alias and sets the alias variables if alias has been set."""
-        data = db.slack_bridge.find_one({
+        data = await async_db.slack_bridge.find_one({
             'team_id': self.team.team_id,
             'aliases': {
                 '$elemMatch': {'slack_id': self.id}
@@ -536,6 +630,12 @@ class SlackChannel:
         self.slack.bot.loop.create_task(self.get_discord_channel())
         self.slack.bot.loop.create_task(self.set_slack_name())
 
+    def __setattr__(self, key, value):
+        # keep the team's discord id index up to date
+        if key == 'discord_channel' and 'team' in self.__dict__ and self.team:
+            self.team.index_discord_channel(self, self.__dict__.get(key), value)
+        self.__dict__[key] = value
+
     def initialize_data(self):
         """Initialise data of the channel in the database if needed."""
         data = db.slack_bridge.find_one(
@@ -561,7 +661,7 @@ class SlackChannel:
 
     async def get_discord_channel(self):
         """Get discord channel if slack channel is bridged with a discord channel."""
-        data = db.slack_bridge.find_one(
+        data = await async_db.slack_bridge.find_one(
             {'team_id': self.team.team_id, 'bridges': {'$elemMatch': {'slack_channel_id': self.id}}},
             {"bridges.$": 1})
         discord_channel_id = data['bridges'][0]['discord_channel_id'] if len(data['bridges']) > 0 else None
@@ -593,6 +693,171 @@ class SlackChannel:
         )
 
 
+class DeliveryQueue:
+    """
+    Per channel queues of messages being sent across the bridge.
+
+    Messages of a channel are sent one at a time in the order they were queued, limited by a token bucket.
+    Jobs can be queued with a key, the id of the message they send, so a job waiting in the queue can be found again:
+    a job queued with the key of a waiting job replaces the waiting job's send instead of being queued again and
+    :func:`cancel` drops the waiting job. Sends which fail because of rate limits or network errors are retried with a backoff.
+
+    Attributes
+    ---------------
+    rate: :class:`float`
+        Messages per second that can be sent to a channel.
+    burst: :class:`int`
+        Messages that can be sent to a channel at once before the rate applies.
+    queues: :class:`dict`
+        Channel id -> deque of waiting jobs, a job is a list of [send function, time queued, key].
+    keyed: :class:`dict`
+        (channel id, key) -> waiting job.
+    latencies: :class:`collections.deque`
+        Seconds the latest sent messages waited in the queue.
+    """
+    max_attempts = 5
+
+    def __init__(self, logger, *, rate: float, burst: int):
+        self.logger = logger
+        self.rate = rate
+        self.burst = burst
+
+        self.queues: dict[Hashable, collections.deque] = {}
+        self.keyed: dict[tuple, list] = {}
+        self.workers: dict[Hashable, asyncio.Task] = {}
+        self.buckets: dict[Hashable, tuple[float, float]] = {}
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.latencies = collections.deque(maxlen=100)
+
+    def put(self, channel_id: Hashable, send: Callable[[], Awaitable], *, key: Hashable = None):
+        """
+        Queue a message to be sent to a channel.
+
+        Parameters
+        ----------------
+        channel_id: :class:`Hashable`
+            ID of the channel, messages of a channel are sent in order.
+        send: Callable[[], Awaitable]
+            Function sending the message.
+        key: :class:`Hashable`
+            ID of the message being sent, if the job should be found again by :func:`is_waiting` and :func:`cancel`.
+        """
+        if key is not None and (channel_id, key) in self.keyed:
+            # replace the waiting job with the latest one
+            self.keyed[(channel_id, key)][0] = send
+            self.coalesced += 1
+            return
+
+        job = [send, time.monotonic(), key]
+        self.queues.setdefault(channel_id, collections.deque()).append(job)
+        if key is not None:
+            self.keyed[(channel_id, key)] = job
+
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.create_task(self.work(channel_id))
+
+    def is_waiting(self, channel_id: Hashable, key: Hashable) -> bool:
+        """Check if a job with the key is waiting in the queue, jobs which have started sending aren't waiting."""
+        return (channel_id, key) in self.keyed
+
+    def cancel(self, channel_id: Hashable, key: Hashable) -> bool:
+        """
+        Drop the job with the key from the queue, if it hasn't started sending yet.
+
+        Returns
+        -------
+        :class:`bool`
+            `True` if a waiting job was dropped.
+        """
+        job = self.keyed.pop((channel_id, key), None)
+        if job is None:
+            return False
+
+        self.queues[channel_id].remove(job)
+        self.cancelled += 1
+        return True
+
+    async def take_token(self, channel_id: Hashable):
+        """Wait until a message can be sent to the channel."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(channel_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            await asyncio.sleep((1 - tokens) / self.rate)
+            tokens, now = 1, time.monotonic()
+
+        self.buckets[channel_id] = (tokens - 1, now)
+
+    async def work(self, channel_id: Hashable):
+        """Send the queued messages of a channel until the queue is empty."""
+        queue = self.queues[channel_id]
+        try:
+            while queue:
+                await self.take_token(channel_id)
+                # the job might've been cancelled while waiting for the token
+                if not queue:
+                    break
+
+                # edits queued while waiting for the token replace the send of the job
+                send, queued_at, key = queue.popleft()
+                # edits made after this one has started need to be sent again
+                self.keyed.pop((channel_id, key), None)
+
+                self.latencies.append(time.monotonic() - queued_at)
+                await self.deliver(send)
+        finally:
+            del self.workers[channel_id]
+            if not queue:
+                del self.queues[channel_id]
+
+    @staticmethod
+    def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+        """Returns seconds to wait before retrying a failed send, None if the send shouldn't be retried."""
+        if isinstance(error, SlackApiError) and error.response.status_code == 429:
+            retry_after = error.response.headers.get('Retry-After', 2 ** attempt)
+            return float(retry_after[0] if isinstance(retry_after, list) else retry_after)
+        if isinstance(error, discord.HTTPException) and (error.status == 429 or error.status >= 500):
+            return float(2 ** attempt)
+        if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+            return float(2 ** attempt)
+
+    async def deliver(self, send: Callable[[], Awaitable]):
+        for attempt in range(self.max_attempts):
+            try:
+                await send()
+                self.sent += 1
+                return
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None or attempt == self.max_attempts - 1:
+                    self.failed += 1
+                    self.logger.exception(f'Failed to send bridged message: {e}')
+                    return
+
+                self.retries += 1
+                self.logger.warning(f'Retrying bridged message in {delay}s: {e}')
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Queue depth, latency and delivery counts."""
+        return {
+            'queued': sum(len(queue) for queue in self.queues.values()),
+            'channels': len(self.queues),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'cancelled': self.cancelled,
+            'latency': sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+            'max_latency': max(self.latencies, default=0.0),
+        }
+
+
 class SlackTeam:
     def __init__(self, data: dict, slack: 'Slack'):
         self.slack = slack
@@ -619,12 +884,25 @@ class SlackTeam:
 
         self.channels: list[SlackChannel] = []
         self.members: list[SlackMember] = []
+        # slack id and discord id indexes of channels and members, maintained by add_channel, add_member and
+        # when the discord channel or member of a slack channel or member is set
+        self.channel_ids: dict[str, SlackChannel] = {}
+        self.discord_channel_ids: dict[int, SlackChannel] = {}
+        self.member_ids: dict[str, SlackMember] = {}
+        self.discord_member_ids: dict[int, SlackMember] = {}
+        self.member_names = MemberNameIndex()
 
         self.slack.bot.loop.create_task(self.get_team_info())
 
         self.discord_messages: TTLCache[int, DiscordMessage] = TTLCache(ttl=600.0, maxsize=500)
         self.slack_messages: TTLCache[str, SlackMessage] = TTLCache(ttl=600.0, maxsize=500)
-        self.message_links = TTLCache(ttl=86400.0, maxsize=1000)
+        # slack message id -> discord message id and discord message id -> slack message id of recent messages,
+        # older links are looked up from the database by get_message_link
+        self.message_links = LRUCache(maxsize=5000)
+
+        # slack allows about a message per second per channel with short bursts
+        self.slack_queue = DeliveryQueue(self.bot.logger, rate=1.0, burst=3)
+        self.discord_queue = DeliveryQueue(self.bot.logger, rate=5.0, burst=5)
 
         self.initialize_data()
         self.messages_cached = asyncio.Event()
@@ -667,42 +945,112 @@ class SlackTeam:
         user_data = await self.app.client.users_info(user=user_id)
         slack_member = SlackMember(user_data['user'], self.slack)
         await slack_member.get_discord_member()
-        self.members[slack_member.team_id].append(slack_member)
+        self.add_member(slack_member)
         return slack_member
 
+    def add_member(self, member: SlackMember):
+        """Add SlackMember to the team's members and indexes."""
+        self.members.append(member)
+        self.member_ids[member.id] = member
+        self.member_names.add(member.id, member.name)
+        if member.discord_member:
+            self.discord_member_ids[member.discord_member.id] = member
+
+    def add_channel(self, channel: SlackChannel):
+        """Add SlackChannel to the team's channels and indexes."""
+        self.channels.append(channel)
+        self.channel_ids[channel.id] = channel
+        if channel.discord_channel:
+            self.discord_channel_ids[channel.discord_channel.id] = channel
+            self.slack.discord_channel_ids[channel.discord_channel.id] = channel
+
+    def remove_channel(self, channel: SlackChannel):
+        """Remove SlackChannel from the team's channels and indexes."""
+        self.channels.remove(channel)
+        if self.channel_ids.get(channel.id) is channel:
+            del self.channel_ids[channel.id]
+        self.index_discord_channel(channel, channel.discord_channel, None)
+
+    def index_discord_channel(self, channel: SlackChannel, old: Optional[discord.TextChannel], new: Optional[discord.TextChannel]):
+        """Move SlackChannel in the team's and the bridge's discord id indexes when its discord channel changes."""
+        if old is not None and self.discord_channel_ids.get(old.id) is channel:
+            del self.discord_channel_ids[old.id]
+        if old is not None and self.slack.discord_channel_ids.get(old.id) is channel:
+            del self.slack.discord_channel_ids[old.id]
+        # channels which haven't been added to the team yet are indexed by add_channel
+        if new is not None and self.channel_ids.get(channel.id) is channel:
+            self.discord_channel_ids[new.id] = channel
+            self.slack.discord_channel_ids[new.id] = channel
+
+    def index_discord_member(self, member: SlackMember, old: Optional[discord.Member], new: Optional[discord.Member]):
+        """Move SlackMember in the discord id index when its discord member changes."""
+        if old is not None and self.discord_member_ids.get(old.id) is member:
+            del self.discord_member_ids[old.id]
+        # members which haven't been added to the team yet are indexed by add_member
+        if new is not None and self.member_ids.get(member.id) is member:
+            self.discord_member_ids[new.id] = member
+
+    def index_member_name(self, member: SlackMember, old: Optional[str], new: str):
+        """Move SlackMember in the name index when its name changes."""
+        # members which haven't been added to the team yet are indexed by add_member
+        if self.member_ids.get(member.id) is not member or old == new:
+            return
+
+        if old is not None:
+            self.member_names.remove(member.id, old)
+        self.member_names.add(member.id, new)
+
     def get_user(self, slack_id: str = None, *, discord_id: int = None) -> Optional[SlackMember]:
         """Get SlackMember via slack id or discord id."""
-        for member in self.members:
-            if (slack_id is not None and member.id == slack_id) or \
-               (discord_id is not None and member.discord_member and member.discord_member.id == discord_id):
-                return member
+        if slack_id is not None and slack_id in self.member_ids:
+            return self.member_ids[slack_id]
+        if discord_id is not None:
+            return self.discord_member_ids.get(discord_id)
 
     def get_channel(self, slack_id: str = None, *, discord_id: int = None) -> Optional[SlackChannel]:
         """Get SlackChannel via slack id or discord id."""
-        for channel in self.channels:
-            if (slack_id is not None and channel.id == slack_id) or \
-               (discord_id is not None and channel.discord_channel and channel.discord_channel.id == discord_id):
-                return channel
+        if slack_id is not None and slack_id in self.channel_ids:
+            return self.channel_ids[slack_id]
+        if discord_id is not None:
+            return self.discord_channel_ids.get(discord_id)
 
     async def cache_messages(self):
-        """Cache messages in the database."""
+        """
+        Wait for members and channels to be cached before handling messages.
+        Message links aren't loaded up front, they're looked up from the database when needed.
+        """
         await self.members_cached.wait()
         await self.channels_cached.wait()
+        self.messages_cached.set()
 
-        messages = db.slack_messages.find({'team_id': self.team_id}).sort('timestamp', 1)
-        for message in messages:
-            twenty_four_hours = 24 * 60 * 60
-            if time.time() - message['timestamp'] > twenty_four_hours:
-                db.slack_messages.delete_one(message)
-                continue
+    async def get_message_link(self, message_id: Union[int, str]) -> Optional[Union[int, str]]:
+        """
+        Get the id of the message on the other side of the bridge.
 
-            if message['origin'] == 'discord':
-                self.message_links[message['discord_message_id']] = message['slack_message_id']
-            elif message['origin'] == 'slack':
-                self.message_links[message['slack_message_id']] = message['discord_message_id']
+        Parameters
+        ----------------
+        message_id: Union[:class:`int`, :class:`str`]
+            Discord message id or slack message id.
 
-        self.messages_cached.set()
-        self.slack.bot.logger.debug(f'{len(self.message_links)} Slack and Discord messages cached for team [{self.team_id}]')
+        Returns
+        -------
+        Optional[Union[:class:`str`, :class:`int`]]
+            Slack message id if discord message id was given, discord message id if slack message id was given.
+        """
+        if message_id in self.message_links:
+            return self.message_links[message_id]
+
+        if isinstance(message_id, int):
+            key, link_key = 'discord_message_id', 'slack_message_id'
+        else:
+            key, link_key = 'slack_message_id', 'discord_message_id'
+
+        data = await async_db.slack_messages.find_one({key: message_id}, {link_key: 1})
+        link = data.get(link_key) if data else None
+        if link is not None:
+            self.message_links[message_id] = link
+
+        return link
 
     async def cache_channels(self):
         """Caches channels."""
@@ -716,7 +1064,7 @@ class SlackTeam:
                 channel_id=channel_data['id'],
                 slack=self.slack,
             )
-            self.channels.append(channel)
+            self.add_channel(channel)
 
         self.channels_cached.set()
         self.slack.bot.logger.debug(f'{len(channels)} Slack channels cached for team [{self.team_id}]')
@@ -733,7 +1081,7 @@ class SlackTeam:
                 slack=self.slack,
             )
             self.slack.bot.loop.create_task(member.get_discord_member())
-            self.members.append(member)
+            self.add_member(member)
 
         self.members_cached.set()
         self.slack.bot.logger.debug(f'{len(members)} Slack member cached for team [{self.team_id}]')
@@ -744,7 +1092,7 @@ class SlackTeam:
         if ts in self.slack_messages:
             del self.slack_messages[ts]
 
-        db.slack_messages.delete_one({'slack_message_id': ts})
+        await async_db.slack_messages.delete_one({'slack_message_id': ts})
 
     async def delete_slack_message(self, message_id: str, discord_channel_id: int, *, discord_message_id: int = None):
         slack_channel = self.get_channel(discord_id=discord_channel_id)
@@ -753,7 +1101,7 @@ class SlackTeam:
         if discord_message_id in self.discord_messages:
             del self.discord_messages[discord_message_id]
 
-        db.slack_messages.delete_one({'discord_message_id': discord_message_id})
+        await async_db.slack_messages.delete_one({'discord_message_id': discord_message_id})
 
     async def get_slack_message(self, channel_id: str, message_id: str, discord_message_id: int = None) -> Optional[SlackMessage]:
         if message_id is None:
@@ -790,7 +1138,7 @@ class SlackTeam:
             message = await channel.fetch_message(message_id)
         except:
             # most-likely errors when message has been deleted
-            db.slack_messages.delete_one({'discord_message_id': message_id})
+            await async_db.slack_messages.delete_one({'discord_message_id': message_id})
             return
 
         if message:
@@ -798,7 +1146,7 @@ class SlackTeam:
             discord_message.slack_message_id = slack_message_id
             return discord_message
         else:
-            db.slack_messages.delete_one({'discord_message_id': message_id})
+            await async_db.slack_messages.delete_one({'discord_message_id': message_id})
 
     async def submission(self, ack):
         """Function that acknowledges events."""
@@ -810,11 +1158,11 @@ class SlackTeam:
         channel_id = event['channel']
         channel = self.get_channel(channel_id)
         if channel:
-            db.slack_bridge.update_one(
+            await async_db.slack_bridge.update_one(
                 {'team_id': self.team_id},
                 {'$pull': {'bridges': {'slack_channel_id': channel_id}}}
             )
-            self.channels.remove(channel)
+            self.remove_channel(channel)
 
     async def slack_member_joined(self, body: dict):
         event = body['event']
@@ -822,11 +1170,11 @@ class SlackTeam:
         user_id = event['user']
         if user_id == self.bot_id:
             channel = SlackChannel(self, channel_id, self.slack)
-            self.channels.append(channel)
+            self.add_channel(channel)
         else:
             user_data = await self.app.client.users_info(user=user_id)
             member = SlackMember(user_data['user'], self.slack)
-            self.members.append(member)
+            self.add_member(member)
 
     async def handle_delete_message(self, body: dict):
         event = body['event']
@@ -835,11 +1183,14 @@ class SlackTeam:
         channel_id = event['channel']
 
         slack_message = self.slack_messages.get(ts, None)
-        slack_message_link = self.message_links.get(ts, None)
 
         if not slack_message:
             slack_channel = self.get_channel(slack_id=channel_id)
-            if not slack_channel.discord_channel or not slack_message_link:
+            if not slack_channel.discord_channel:
+                return
+
+            slack_message_link = await self.get_message_link(ts)
+            if not slack_message_link:
                 return
             return await self.delete_discord_message(slack_channel.discord_channel.id, slack_message_link, ts=ts)
 
@@ -858,13 +1209,15 @@ class SlackTeam:
 
         slack_message = self.slack_messages.get(ts, None)
         if not slack_message:
-            slack_message_link = self.message_links[ts] if ts in self.message_links else None
+            slack_message_link = await self.get_message_link(ts)
             slack_message = await self.get_slack_message(channel_id, ts, slack_message_link)
 
         if slack_message:
             slack_message.text = event['message']['text']
-            asyncio.create_task(
-                slack_message.send_to_discord(edit=True)
+            self.discord_queue.put(
+                channel_id,
+                functools.partial(slack_message.send_to_discord, edit=True),
+                key=ts
             )
 
     async def slack_message(self, body):
@@ -885,9 +1238,7 @@ class SlackTeam:
             return
 
         message = SlackMessage(body, self.slack)
-        asyncio.create_task(
-            message.send_to_discord()
-        )
+        self.discord_queue.put(message.channel_id, message.send_to_discord)
 
     # Discord events
 
@@ -902,9 +1253,14 @@ class SlackTeam:
         await team.messages_cached.wait()
 
         message_id = payload.message_id
+        # drop the send or edit of the message if it's still waiting to be sent
+        team.slack_queue.cancel(slack_channel.id, message_id)
+
         discord_message = team.discord_messages.get(message_id, None)
         if not discord_message:
-            discord_message_link = team.message_links[message_id]
+            discord_message_link = await team.get_message_link(message_id)
+            if not discord_message_link:
+                return
             return await team.delete_slack_message(discord_message_link, channel_id, discord_message_id=message_id)
 
         await discord_message.delete()
@@ -930,13 +1286,22 @@ class SlackTeam:
         content = payload.data['content']
         cached_message = team.discord_messages.get(message_id, None)
         if not cached_message:
-            cached_message_link = team.message_links.get(message_id, None)
+            cached_message_link = await team.get_message_link(message_id)
             cached_message = await team.get_discord_message(channel_id, message_id, cached_message_link)
             if cached_message is None:
                 return
 
         cached_message.text = content
-        await cached_message.send_to_slack(edit=True)
+        # a send or edit of the message which is still waiting will send the new text
+        if team.slack_queue.is_waiting(slack_channel.id, message_id):
+            return
+
+        # if the message is still being sent, the edit is sent after it, since the messages of a channel are sent in order
+        team.slack_queue.put(
+            slack_channel.id,
+            functools.partial(cached_message.send_to_slack, edit=True),
+            key=message_id
+        )
 
     async def on_message(self, message: discord.Message):
         """Function call on on_message event, used for identifying discord bridge channel and forwarding the messages to slack."""
@@ -951,7 +1316,9 @@ class SlackTeam:
         await self.messages_cached.wait()
 
         discord_message = DiscordMessage(message, self.slack)
-        await discord_message.send_to_slack()
+        # cached before it's sent, so edits and deletes that happen while the message is queued can find it
+        self.discord_messages[discord_message.id] = discord_message
+        self.slack_queue.put(slack_channel.id, discord_message.send_to_slack, key=discord_message.id)
 
 
 class Slack:
@@ -960,16 +1327,70 @@ class Slack:
         self.logger = self.bot.logger
 
         self.teams: list[SlackTeam] = []
+        self.team_ids: dict[str, SlackTeam] = {}
+        # discord id index of the channels of every team, maintained by the teams along with their own indexes
+        self.discord_channel_ids: dict[int, SlackChannel] = {}
+        self.create_indexes()
         self.cache_teams()
 
+        self.bot.add_listener(self.on_ready, 'on_ready')
+
+    async def on_ready(self):
+        self.log_delivery_stats.start()
+        await self.migrate_message_timestamps()
+
+    @timers.loop(minutes=10)
+    async def log_delivery_stats(self):
+        """Periodically log the stats of the outbound message queues."""
+        for team_id, stats in self.delivery_stats().items():
+            self.logger.info(f'Slack bridge delivery [{team_id}]: {stats}')
+
+    @staticmethod
+    def create_indexes():
+        """Create the indexes of the slack_messages collection, bridged messages expire after 24 hours."""
+        db.slack_messages.create_index('timestamp', expireAfterSeconds=24 * 60 * 60)
+        db.slack_messages.create_index('slack_message_id')
+        db.slack_messages.create_index('discord_message_id')
+
+    @staticmethod
+    async def migrate_message_timestamps():
+        """
+        Convert the timestamps of messages stored before timestamps were dates, which the ttl index would never remove.
+        Only runs once, the migration is recorded in the migrations collection.
+        """
+        if await async_db.migrations.find_one({'_id': 'slack_message_timestamps'}):
+            return
+
+        # timestamps were seconds since the epoch, dates are milliseconds
+        await async_db.slack_messages.update_many(
+            {'timestamp': {'$type': 'number'}},
+            [{'$set': {'timestamp': {'$toDate': {'$multiply': ['$timestamp', 1000]}}}}]
+        )
+        await async_db.migrations.update_one(
+            {'_id': 'slack_message_timestamps'},
+            {'$set': {'timestamp': datetime.datetime.utcnow()}},
+            upsert=True
+        )
+
     def get_team(self, team_id: str) -> Optional[SlackTeam]:
-        return next(filter(lambda team: team.team_id == team_id, self.teams), None)
+        return self.team_ids.get(team_id)
+
+    def add_team(self, team: SlackTeam):
+        self.teams.append(team)
+        self.team_ids[team.team_id] = team
 
     def cache_teams(self):
         teams = db.slack_bridge.find({})
         for team_data in teams:
             team = SlackTeam(team_data, self)
-            self.teams.append(team)
+            self.add_team(team)
+
+    def delivery_stats(self) -> dict:
+        """Stats of the outbound message queues of every team."""
+        return {
+            team.team_id: {'slack': team.slack_queue.stats(), 'discord': team.discord_queue.stats()}
+            for team in self.teams
+        }
 
     def get_user(self, slack_id: str = None, *, discord_id: int = None) -> Optional[SlackMember]:
         """Get SlackMember via slack id or discord id."""
@@ -980,6 +1401,9 @@ class Slack:
 
     def get_channel(self, slack_id: str = None, *, discord_id: int = None) -> Optional[SlackChannel]:
         """Get SlackChannel via slack id or discord id."""
+        if slack_id is None and discord_id is not None:
+            return self.discord_channel_ids.get(discord_id)
+
         for team in self.teams:
             channel = team.get_channel(slack_id, discord_id=discord_id)
             if channel:
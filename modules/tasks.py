@@ -1,47 +1,159 @@
 import asyncio
+import time
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
 from modules import database, slack_bridge
 
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class Tasks:
-    def __init__(self, bot):
+    """
+    Runs the tasks queued in the tasks collection, for example by the api.
+
+    Tasks are claimed atomically with a lease, which is renewed while the task runs, so a task is only run by one worker
+    at a time and a task whose worker crashed is claimed again after the lease expires. Failed tasks are retried with backoff up to :attr:`max_attempts` times.
+    New tasks are picked up from a change stream if the deployment supports them, otherwise the collection is polled
+    with a backoff that grows while the queue is empty.
+
+    Attributes
+    ---------------
+    bot: :class:`bot.TLDR`
+        The discord bot.
+    max_workers: :class:`int`
+        How many tasks can run at the same time.
+    lease_time: :class:`int`
+        How many seconds a claimed task is reserved for, the lease is renewed every half of this while the task runs.
+    max_attempts: :class:`int`
+        How many times a task is tried before it's left in the collection as failed.
+    max_poll_interval: :class:`float`
+        The longest time between polls when the queue is empty.
+    """
+
+    def __init__(self, bot, *, max_workers: int = 4, lease_time: int = 60, max_attempts: int = 5, max_poll_interval: float = 30.0):
         self.bot = bot
+        self.max_workers = max_workers
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.max_poll_interval = max_poll_interval
+
+        self.workers = asyncio.Semaphore(max_workers)
+        self.wakeup = asyncio.Event()
+        self.watching = False
+        self.listening = False
+
         self.bot.add_listener(self.on_ready, 'on_ready')
         self.bot.logger.info('Task module has been initiated')
 
     async def on_ready(self):
+        # on_ready can be called multiple times
+        if self.listening:
+            return
+
+        self.listening = True
+        self.bot.loop.create_task(self.watch())
         self.bot.loop.create_task(self.listen())
 
+    async def watch(self):
+        """Wake up :func:`listen` when a task is inserted, needs a replica set for change streams."""
+        try:
+            async with db.tasks.watch([{'$match': {'operationType': 'insert'}}]) as stream:
+                self.watching = True
+                self.bot.logger.info('Task module is watching the tasks collection for new tasks.')
+                async for _ in stream:
+                    self.wakeup.set()
+        except OperationFailure as e:
+            self.bot.logger.info(f'Change streams are not available, task module will poll for tasks. {e}')
+        except Exception as e:
+            self.bot.logger.error(f'Task change stream stopped, task module will poll for tasks. {e}')
+        finally:
+            self.watching = False
+
+    async def claim(self):
+        """Atomically claim the oldest task which isn't leased and hasn't run out of attempts."""
+        now = time.time()
+        return await db.tasks.find_one_and_update(
+            {
+                'lease_expires': {'$not': {'$gt': now}},
+                'attempts': {'$not': {'$gte': self.max_attempts}},
+            },
+            {'$set': {'lease_expires': now + self.lease_time}, '$inc': {'attempts': 1}},
+            sort=[('_id', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
     async def listen(self):
         self.bot.logger.info('Task module has started listening to tasks.')
+        poll_interval = 1.0
         while True:
-            await asyncio.sleep(1.0)
-            tasks = db.tasks.find({})
-            if not tasks:
+            await self.workers.acquire()
+            # cleared before claiming, so a task inserted during the claim wakes the loop up instead of being missed
+            self.wakeup.clear()
+            try:
+                task = await self.claim()
+            except Exception as e:
+                self.bot.logger.error(f'Error claiming task {e}')
+                task = None
+
+            if task:
+                poll_interval = 1.0
+                self.bot.loop.create_task(self.run(task))
                 continue
 
-            for task in tasks:
-                function_name = task['function']
-                kwargs = task['kwargs']
-                function = getattr(self, function_name, None)
-                if function is None:
-                    self.bot.logger.error(f'Invalid task function [{function_name}]')
+            self.workers.release()
+
+            # when the change stream is running it wakes the loop up, polling is only a safety net for retries
+            timeout = self.max_poll_interval if self.watching else poll_interval
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                poll_interval = min(poll_interval * 2, self.max_poll_interval)
+
+    async def renew_lease(self, task_id):
+        """Keep extending the lease of a running task, so it isn't claimed by another worker before it's done."""
+        while True:
+            await asyncio.sleep(self.lease_time / 2)
+            try:
+                # $max so a renewal that lands after the task is done can't shorten the retry backoff
+                await db.tasks.update_one({'_id': task_id}, {'$max': {'lease_expires': time.time() + self.lease_time}})
+            except Exception as e:
+                self.bot.logger.error(f'Error renewing task lease {e}')
+
+    async def run(self, task: dict):
+        """Run a claimed task and delete it if it succeeds, otherwise schedule a retry."""
+        try:
+            function_name = task['function']
+            function = getattr(self, function_name, None)
+            if function is None:
+                self.bot.logger.error(f'Invalid task function [{function_name}]')
+                return await db.tasks.delete_one({'_id': task['_id']})
 
+            renew = self.bot.loop.create_task(self.renew_lease(task['_id']))
+            try:
                 try:
-                    await function(**kwargs)
-                except Exception as e:
-                    self.bot.logger.error(f'Error with task function [{function_name}] {e}')
+                    await function(**task['kwargs'])
+                finally:
+                    renew.cancel()
+            except Exception as e:
+                self.bot.logger.error(f'Error with task function [{function_name}] attempt {task["attempts"]} {e}')
+                # retry after a backoff, lease keeps other workers from claiming it before then
+                retry_in = min(5 * 2 ** task['attempts'], 600)
+                await db.tasks.update_one({'_id': task['_id']}, {'$set': {'lease_expires': time.time() + retry_in}})
+                return
 
-                db.tasks.delete_one(task)
+            await db.tasks.delete_one({'_id': task['_id']})
+        finally:
+            self.workers.release()
 
     async def update_slack_team(self, *, team_id: str):
         slack = self.bot.slack_bridge
-        team_data = db.slack_bridge.find_one({'team_id': team_id})
+        team_data = await db.slack_bridge.find_one({'team_id': team_id})
         team = slack.get_team(team_id)
         if not team:
             team = slack_bridge.SlackTeam(team_data, slack)
-            slack.teams.append(team)
+            slack.add_team(team)
         else:
             team.token = team_data['token']
             team.bot_id = team_data['bot_id']
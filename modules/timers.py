@@ -1,16 +1,122 @@
 import asyncio
+import heapq
+import random
 import time
 
 from bson import ObjectId
 from discord.ext.commands import Bot
+from pymongo import ReturnDocument
 
 from modules import database
 
-db = database.get_connection()
+db = database.get_async_connection()
+
+
+# registry of loop name to the metrics of that loop
+loop_metrics = {}
+
+
+class LoopMetrics:
+    """
+    Run time, lag and error counts of a :class:`Loop`.
+
+    Attributes
+    ---------------
+    runs: :class:`int`
+        How many times the loop has run.
+    errors: :class:`int`
+        How many runs have raised an exception.
+    skipped: :class:`int`
+        How many runs have been skipped, because the previous run was still going or the loop fell behind.
+    last_run_time: :class:`float`
+        How many seconds the last run took.
+    max_run_time: :class:`float`
+        How many seconds the longest run took.
+    total_run_time: :class:`float`
+        How many seconds all the runs have taken.
+    last_lag: :class:`float`
+        How many seconds late the last run was started.
+    max_lag: :class:`float`
+        The most seconds any run was started late.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+        self.last_run_time = 0.0
+        self.max_run_time = 0.0
+        self.total_run_time = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def record_lag(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def record_run(self, run_time: float, error: bool):
+        self.runs += 1
+        self.errors += int(error)
+        self.last_run_time = run_time
+        self.max_run_time = max(self.max_run_time, run_time)
+        self.total_run_time += run_time
+
+    def values(self) -> dict:
+        """Returns info in the form of a dictionary."""
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "last_run_time": self.last_run_time,
+            "max_run_time": self.max_run_time,
+            "average_run_time": self.total_run_time / self.runs if self.runs else 0.0,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
+
+
+def get_loop_metrics() -> dict:
+    """
+    Get the metrics of all the loops.
+
+    Returns
+    -------
+    :class:`dict`
+        Dictionary of loop name to the values of :class:`LoopMetrics`.
+    """
+    return {name: metrics.values() for name, metrics in loop_metrics.items()}
 
 
 class Loop:
-    def __init__(self, coro, seconds, minutes, hours):
+    """
+    Calls a coroutine every :attr:`time` seconds, after :func:`start` has been called.
+
+    Runs are scheduled on the monotonic clock from when the loop was started, so the time a run takes doesn't push
+    the following runs back.
+
+    Attributes
+    ---------------
+    coro: :class:`Callable`
+        The coroutine function.
+    time: :class:`float`
+        Seconds between runs.
+    jitter: :class:`float`
+        Up to how many seconds of random delay is added to each run.
+    overlap: :class:`str`
+        What to do when a run is due while the previous one is still going,
+        `skip` skips the run, `queue` starts the run as soon as the previous one is done, `concurrent` starts it anyway.
+    name: :class:`str`
+        Name of the loop in :data:`loop_metrics`.
+    metrics: :class:`LoopMetrics`
+        The metrics of the loop.
+    """
+
+    overlap_policies = ["skip", "queue", "concurrent"]
+
+    def __init__(self, coro, seconds, minutes, hours, *, jitter=0.0, overlap="skip"):
+        if overlap not in self.overlap_policies:
+            raise ValueError(f"Invalid overlap policy [{overlap}], must be one of {self.overlap_policies}")
+
         self.coro = coro
         self._injected = None
 
@@ -18,13 +124,24 @@ class Loop:
         self.minutes = minutes
         self.hours = hours
         self.time = seconds + (minutes * 60) + (hours * 60 * 60)
+        self.jitter = jitter
+        self.overlap = overlap
+
+        self.attribute_name = coro.__name__
+        self.name = coro.__qualname__
+        self.metrics = loop_metrics.setdefault(self.name, LoopMetrics())
 
         self.started = asyncio.Event()
-        self.loop = asyncio.get_event_loop()
-        self.loop.create_task(self.run_loop())
+        self.task = None
+        self.running = 0
+
+    def __set_name__(self, owner, name):
+        self.attribute_name = name
 
     def start(self):
         self.started.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_event_loop().create_task(self.run_loop())
 
     def stop(self):
         self.started.clear()
@@ -36,39 +153,80 @@ class Loop:
         if obj is None:
             return self
 
-        self._injected = obj
-        return self
+        # every instance gets its own loop, so instances of the same class don't share a schedule
+        bound_loop = Loop(
+            self.coro,
+            self.seconds,
+            self.minutes,
+            self.hours,
+            jitter=self.jitter,
+            overlap=self.overlap,
+        )
+        bound_loop._injected = obj
+        obj.__dict__[self.attribute_name] = bound_loop
+        return bound_loop
 
     async def run_loop(self):
-        print(self.started.is_set())
-        await self.started.wait()
-        while True:
-            await asyncio.sleep(self.time)
-
-            # if loop is stopped return to waiting
-            if not self.started.is_set() or not self.loop.is_running():
-                return await self.run_loop()
-
-            try:
-                await self.coro(self._injected)
-            except Exception as e:
-                if hasattr(self._injected, "bot"):
-                    await self._injected.bot.on_event_error(
-                        e, self.coro.__name__, loop=True
-                    )
-                if isinstance(self._injected, Bot):
-                    # checking if isinstace bot, cause can't import TLDR due to circular import
-                    await self._injected.on_event_error(
-                        e, self.coro.__name__, loop=True
-                    )
-
-
-def loop(*, seconds=0, minutes=0, hours=0):
+        next_run = time.monotonic() + self.time
+        while self.started.is_set():
+            delay = next_run - time.monotonic()
+            if self.jitter:
+                delay += random.uniform(0, self.jitter)
+
+            await asyncio.sleep(max(delay, 0))
+
+            # if loop was stopped while sleeping
+            if not self.started.is_set():
+                break
+
+            now = time.monotonic()
+            self.metrics.record_lag(max(now - next_run, 0))
+
+            if self.overlap == "queue":
+                await self.run_once()
+            elif self.overlap == "skip" and self.running:
+                self.metrics.skipped += 1
+            else:
+                asyncio.create_task(self.run_once())
+
+            next_run += self.time
+            # queued runs catch up on missed runs, other policies skip them
+            if self.overlap != "queue":
+                now = time.monotonic()
+                while next_run <= now:
+                    next_run += self.time
+                    self.metrics.skipped += 1
+
+    async def run_once(self):
+        self.running += 1
+        start = time.monotonic()
+        error = False
+        try:
+            await self.coro(self._injected)
+        except Exception as e:
+            error = True
+            if hasattr(self._injected, "bot"):
+                await self._injected.bot.on_event_error(
+                    e, self.coro.__name__, loop=True
+                )
+            if isinstance(self._injected, Bot):
+                # checking if isinstace bot, cause can't import TLDR due to circular import
+                await self._injected.on_event_error(
+                    e, self.coro.__name__, loop=True
+                )
+        finally:
+            self.running -= 1
+            self.metrics.record_run(time.monotonic() - start, error)
+
+
+def loop(*, seconds=0, minutes=0, hours=0, jitter=0.0, overlap="skip"):
     def decorator(func):
         kwargs = {
             "seconds": seconds,
             "minutes": minutes,
             "hours": hours,
+            "jitter": jitter,
+            "overlap": overlap,
         }
         return Loop(func, **kwargs)
 
@@ -80,74 +238,199 @@ class Timers:
     Class for implementing functions with timed calls.
     Functions will be called by dispatching bot events by the name `on_{event}_timer_over`.
 
+    A single scheduler task runs the timers from a min-heap ordered by expiry time. Only the timers which expire
+    within :attr:`window` seconds are loaded from the database, the rest are loaded when the window moves forward.
+
     Attributes
     ---------------
     bot: :class:`bot.TLDR`
         The discord bot.
+    window: :class:`int`
+        How many seconds ahead timers are loaded from the database.
+    heap: :class:`list`
+        Min-heap of (expires, timer id) tuples.
+    timers: :class:`dict`
+        Dictionary of timer id to timer dictionary, for the timers loaded into :attr:`heap`.
+    loaded_until: :class:`float`
+        Time until which all the timers have been loaded from the database.
+    lease_time: :class:`int`
+        How many seconds a claimed timer is reserved for this process, if the process dies before the timer is deleted,
+        the timer can be claimed again after the lease expires.
     """
 
-    def __init__(self, bot):
+    def __init__(self, bot, *, window: int = 3600, lease_time: int = 60):
         self.bot = bot
+        self.window = window
+        self.lease_time = lease_time
+
+        self.heap = []
+        self.timers = {}
+        self.firing = set()
+        self.loaded_until = 0
+        self.wakeup = asyncio.Event()
+        self.scheduler = None
+
         self.bot.add_listener(self.on_ready, "on_ready")
         self.bot.logger.info("Timers module has been initiated")
 
     async def on_ready(self):
-        await self.run_old()
-
-    async def run_loop(self, loop: Loop):
-        await loop.started.wait()
-        while True:
-            # if loop is stopped return
-            if not loop.started.is_set():
-                return self.run_loop(loop)
+        self.log_loop_metrics.start()
+        await self.start_scheduler()
 
-            await asyncio.sleep(loop.time)
-            await loop.coro()
+    @loop(minutes=30)
+    async def log_loop_metrics(self):
+        """Periodically log the metrics of all the loops, so loops that run late or take too long can be found."""
+        for name, metrics in get_loop_metrics().items():
+            self.bot.logger.info(f"Loop [{name}]: {metrics}")
 
-    async def run_old(self) -> None:
-        """Runs all the timers that were cut short, that are still in the database."""
+    async def start_scheduler(self) -> None:
+        """Starts the scheduler, which runs timers as they expire, including the ones that expired while the bot was offline."""
         await self.bot.left_check.wait()
 
-        timers = db.timers.find({})
-        self.bot.logger.info(f"Running {timers.count()} old timers.")
+        # on_ready can be called multiple times
+        if self.scheduler is not None and not self.scheduler.done():
+            return
+
+        await self.create_indexes()
+
+        timer_count = await db.timers.count_documents({})
+        self.bot.logger.info(f"Running {timer_count} old timers.")
+
+        self.scheduler = asyncio.create_task(self.run_scheduler())
+
+    @staticmethod
+    async def create_indexes():
+        """Create the indexes used for finding due timers and timers by message."""
+        await db.timers.create_index("expires")
+        await db.timers.create_index([("extras.message_id", 1), ("event", 1)])
+        await db.timers.create_index("extras.main_poll_id", sparse=True)
+
+    def schedule(self, timer: dict):
+        """Add timer to the heap, if it expires within the loaded window."""
+        if timer["expires"] > self.loaded_until:
+            return
+
+        timer_id = str(timer["_id"])
+        if timer_id in self.firing:
+            return
+
+        self.timers[timer_id] = timer
+        heapq.heappush(self.heap, (timer["expires"], timer_id))
+        self.wakeup.set()
+
+    async def load_window(self, now: float):
+        """Load the timers which expire before the end of the next window."""
+        # advance the window before querying, so timers created while the query is running are scheduled by schedule()
+        previous_loaded_until = self.loaded_until
+        self.loaded_until = now + self.window
+        try:
+            timers = await db.timers.find({"expires": {"$lte": self.loaded_until}}).to_list(length=None)
+        except Exception:
+            self.loaded_until = previous_loaded_until
+            raise
 
         for timer in timers:
-            asyncio.create_task(self.run(timer))
+            if str(timer["_id"]) not in self.timers:
+                self.schedule(timer)
 
-    async def run(self, timer) -> None:
+    async def run_scheduler(self):
+        """Sleeps until the next timer expires, then runs all the expired timers."""
+        while True:
+            now = time.time()
+            # move the window forward when half of it has passed
+            if now + self.window / 2 >= self.loaded_until:
+                try:
+                    await self.load_window(now)
+                except Exception as e:
+                    self.bot.logger.exception(f"Failed to load timers: {e}")
+
+            due_timers = []
+            while self.heap and self.heap[0][0] <= now:
+                expires, timer_id = heapq.heappop(self.heap)
+                timer = self.timers.get(timer_id)
+                # entry is stale if the timer was cancelled or rescheduled
+                if timer is None or timer["expires"] != expires:
+                    continue
+
+                del self.timers[timer_id]
+                self.firing.add(timer_id)
+                due_timers.append(timer)
+
+            if due_timers:
+                asyncio.create_task(self.call_events(due_timers))
+
+            next_run = self.loaded_until - self.window / 2
+            if self.heap:
+                next_run = min(next_run, self.heap[0][0])
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=max(next_run - time.time(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim(self, timer_ids: list) -> list:
         """
-        Runs a timer, by sleeping until the timer expires.
+        Atomically claim timers by deleting them from the database, so each timer is only dispatched once,
+        even if multiple processes are running timers.
+
+        A single timer is claimed with find_one_and_delete, multiple timers are leased with one update and
+        then fetched and deleted as a batch.
 
         Parameters
         ----------------
-        timer: :class:`dict`
-            Timer dictionary from :func:`create`
+        timer_ids: :class:`list`
+            IDs of the timers.
+
+        Returns
+        -------
+        :class:`list`
+            The claimed timers, timers that were deleted, changed or claimed by someone else are left out.
         """
-        now = round(time.time())
+        object_ids = [ObjectId(timer_id) for timer_id in timer_ids]
+        if len(object_ids) == 1:
+            timer = await db.timers.find_one_and_delete(
+                {"_id": object_ids[0], "lease.expires": {"$not": {"$gt": time.time()}}}
+            )
+            return [timer] if timer else []
+
+        lease_id = ObjectId()
+        now = time.time()
+        await db.timers.update_many(
+            {"_id": {"$in": object_ids}, "lease.expires": {"$not": {"$gt": now}}},
+            {"$set": {"lease": {"id": lease_id, "expires": now + self.lease_time}}},
+        )
+
+        query = {"_id": {"$in": object_ids}, "lease.id": lease_id}
+        timers = await db.timers.find(query).to_list(length=None)
+        await db.timers.delete_many(query)
 
-        if timer["expires"] > now:
-            await asyncio.sleep(timer["expires"] - now)
+        for timer in timers:
+            del timer["lease"]
 
-        self.call_event(timer)
+        return timers
 
-    def call_event(self, timer) -> None:
+    async def call_events(self, timers: list) -> None:
         """
-        Call timer event.
-        Event will be dispatched with the name `on_{event}_timer_over`.
+        Claim timers and call their events.
+        Events will be dispatched with the name `on_{event}_timer_over`.
 
         Parameters
         ----------------
-        timer: :class:`dict`
-            Timer dictionary from :func:`create`
+        timers: :class:`list`
+            List of timer dictionaries from :func:`create`
         """
-        timer = db.timers.find_one({"_id": ObjectId(timer["_id"])})
-        if not timer:
-            return
+        timer_ids = [str(timer["_id"]) for timer in timers]
+        try:
+            # timers might've been deleted or changed after they were loaded
+            claimed_timers = await self.claim(timer_ids)
+        finally:
+            self.firing.difference_update(timer_ids)
 
-        db.timers.delete_one({"_id": ObjectId(timer["_id"])})
-        self.bot.dispatch(f'{timer["event"]}_timer_over', timer)
+        for timer in claimed_timers:
+            self.bot.dispatch(f'{timer["event"]}_timer_over', timer)
 
-    def create(self, *, guild_id: int, expires: int, event: str, extras: dict):
+    async def create(self, *, guild_id: int, expires: int, event: str, extras: dict) -> str:
         """
         Create a new timer.
 
@@ -161,6 +444,11 @@ class Timers:
             The name of the event that will be dispatched with the name `on_{event}_timer_over`.
         extras: :class:`dict`
             Extra data that can be passed to the timer.
+
+        Returns
+        -------
+        :class:`str`
+            The ID of the timer.
         """
         timer_dict = {
             "guild_id": guild_id,
@@ -169,6 +457,67 @@ class Timers:
             "extras": extras,
         }
 
-        result = db.timers.insert_one(timer_dict)
+        result = await db.timers.insert_one(timer_dict)
         timer_dict["_id"] = str(result.inserted_id)
-        asyncio.create_task(self.run(timer_dict))
+        self.schedule(timer_dict)
+        return timer_dict["_id"]
+
+    async def create_many(self, timers: list):
+        """
+        Create multiple timers with a single database write.
+
+        Parameters
+        ----------------
+        timers: :class:`list`
+            List of dictionaries with the same keys as the kwargs of :func:`create`.
+        """
+        if not timers:
+            return
+
+        timer_dicts = [
+            {
+                "guild_id": timer["guild_id"],
+                "expires": timer["expires"],
+                "event": timer["event"],
+                "extras": timer["extras"],
+            }
+            for timer in timers
+        ]
+
+        result = await db.timers.insert_many(timer_dicts)
+        for timer_dict, inserted_id in zip(timer_dicts, result.inserted_ids):
+            timer_dict["_id"] = str(inserted_id)
+            self.schedule(timer_dict)
+
+    async def cancel(self, timer_id: str):
+        """
+        Cancel a timer and delete it from the database.
+
+        Parameters
+        ----------------
+        timer_id: :class:`str`
+            ID of the timer.
+        """
+        timer_id = str(timer_id)
+        # heap entry is left behind and skipped when it's popped
+        self.timers.pop(timer_id, None)
+        await db.timers.delete_one({"_id": ObjectId(timer_id)})
+
+    async def reschedule(self, timer_id: str, expires: int):
+        """
+        Change when a timer expires.
+
+        Parameters
+        ----------------
+        timer_id: :class:`str`
+            ID of the timer.
+        expires: :class:`int`
+            The new time when the timer will expire.
+        """
+        timer_id = str(timer_id)
+        timer = await db.timers.find_one_and_update(
+            {"_id": ObjectId(timer_id)}, {"$set": {"expires": expires}}, return_document=ReturnDocument.AFTER
+        )
+        self.timers.pop(timer_id, None)
+        if timer:
+            self.schedule(timer)
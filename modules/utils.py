@@ -4,17 +4,27 @@ import asyncio
 import logging
 import os
 import sys
-import requests
+import tempfile
+import aiohttp
 
 from io import BytesIO
 from logging import handlers
-from typing import Tuple, Union, Optional
+from typing import IO, Tuple, Union, Optional
+from urllib.parse import urlparse
 from modules import embed_maker, database, commands
 from discord.ext.commands import Context, Converter
 
 db = database.get_connection()
 log_session = None
 
+# shared session and per host concurrency limits of async_file_downloader
+file_download_session: Optional[aiohttp.ClientSession] = None
+file_download_limits: dict[str, asyncio.Semaphore] = {}
+FILE_DOWNLOAD_HOST_LIMIT = 4
+FILE_DOWNLOAD_SIZE_LIMIT = 50 * 1024 * 1024
+# files larger than this are moved from memory to a temporary file while downloading
+FILE_DOWNLOAD_SPOOL_SIZE = 1024 * 1024
+
 
 class SettingsHandler:
     """
@@ -659,20 +669,79 @@ def embed_message_to_text(embed):
     return text
 
 
-async def async_file_downloader(urls: list[str], headers: dict = None) -> list[BytesIO]:
-    async def fetch_file(index: int, files: list, url: str):
-        response = requests.get(url, headers=headers)
-        file = BytesIO(response.content)
-        file.seek(0)
-        files[index] = file
+def get_file_download_session() -> aiohttp.ClientSession:
+    """Get the session shared by file downloads, creating it if needed."""
+    global file_download_session
+
+    if file_download_session is None or file_download_session.closed:
+        file_download_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300, sock_read=60))
+
+    return file_download_session
+
 
-    futures = []
-    files = [None] * len(urls)
-    for i, url in enumerate(urls):
-        future = asyncio.create_task(fetch_file(i, files, url))
-        futures.append(future)
+async def close_file_download_session():
+    """Close the session shared by file downloads."""
+    if file_download_session is not None and not file_download_session.closed:
+        await file_download_session.close()
+
+
+async def download_file(url: str, *, headers: dict = None, max_size: int = FILE_DOWNLOAD_SIZE_LIMIT) -> Optional[IO[bytes]]:
+    """
+    Stream a file into memory, or into a temporary file if it's larger than :data:`FILE_DOWNLOAD_SPOOL_SIZE`.
 
-    if futures:
-        await asyncio.gather(*futures)
+    Parameters
+    -----------
+    url: :class:`str`
+        Url of the file.
+    headers: :class:`dict`
+        Headers sent with the request.
+    max_size: :class:`int`
+        Files larger than this many bytes aren't downloaded.
+
+    Returns
+    -------
+    Optional[IO[:class:`bytes`]]
+        The file, positioned at the start, or None if the download failed or the file was too large.
+    """
+    host = urlparse(url).hostname
+    limit = file_download_limits.setdefault(host, asyncio.Semaphore(FILE_DOWNLOAD_HOST_LIMIT))
 
-    return [file for file in files if file]
+    async with limit:
+        file = BytesIO()
+        try:
+            async with get_file_download_session().get(url, headers=headers) as response:
+                if response.status != 200 or (response.content_length or 0) > max_size:
+                    return None
+
+                size = 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > max_size:
+                        file.close()
+                        return None
+
+                    if size > FILE_DOWNLOAD_SPOOL_SIZE and isinstance(file, BytesIO):
+                        temporary_file = tempfile.TemporaryFile()
+                        temporary_file.write(file.getbuffer())
+                        file.close()
+                        file = temporary_file
+
+                    file.write(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            file.close()
+            return None
+
+    file.seek(0)
+    return file
+
+
+async def async_file_downloader(urls: list[str], headers: dict = None, *, max_size: int = FILE_DOWNLOAD_SIZE_LIMIT) -> list[Optional[IO[bytes]]]:
+    """
+    Download files concurrently, with at most :data:`FILE_DOWNLOAD_HOST_LIMIT` downloads per host at a time.
+
+    Returns
+    -------
+    List[Optional[IO[:class:`bytes`]]]
+        The files in the same order as the urls, None for files which couldn't be downloaded or were too large.
+    """
+    return list(await asyncio.gather(*[download_file(url, headers=headers, max_size=max_size) for url in urls]))
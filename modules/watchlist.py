@@ -1,10 +1,10 @@
-import datetime
+import asyncio
 import discord
 
 from typing import Optional
 from modules import database
 
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class Watchlist:
@@ -17,26 +17,35 @@ class Watchlist:
 
         self.members = {}
         self.watchlist_data = {}
+        # guild id -> watchlist category
+        self.categories = {}
+        # channel id -> messages waiting to be forwarded to the channel and the task forwarding them
+        self.queues = {}
+        self.senders = {}
         self.bot.add_listener(self.on_message, 'on_message')
         self.bot.add_listener(self.on_ready, 'on_ready')
 
     async def on_ready(self):
-        self.bot.watchlist.initialize()
+        await self.bot.watchlist.initialize()
 
-    def initialize(self):
+    async def initialize(self):
         """Cache all the existing webhook users."""
         for guild in self.bot.guilds:
             self.watchlist_data[guild.id] = {}
             users = db.watchlist.find({"guild_id": guild.id})
-            for user in users:
+            async for user in users:
                 self.watchlist_data[guild.id][user['user_id']] = user
 
-    @staticmethod
-    async def get_watchlist_category(guild: discord.Guild) -> Optional[discord.CategoryChannel]:
+    async def get_watchlist_category(self, guild: discord.Guild) -> Optional[discord.CategoryChannel]:
         """Get the watchlist category or create it if it doesn't exist."""
         if guild is None:
             return
 
+        category = self.categories.get(guild.id)
+        # make sure cached category hasn't been deleted
+        if category is not None and guild.get_channel(category.id) is not None:
+            return category
+
         category = discord.utils.get(guild.categories, name='Watchlist')
         if category is None:
             # get all staff roles
@@ -46,6 +55,7 @@ class Watchlist:
             overwrites[guild.default_role] = discord.PermissionOverwrite(view_channel=False, read_messages=False)
             category = await guild.create_category(name='Watchlist', overwrites=overwrites)
 
+        self.categories[guild.id] = category
         return category
 
     def get_member(self, member: discord.Member) -> Optional[dict]:
@@ -66,7 +76,7 @@ class Watchlist:
             'filters': filters,
             'channel_id': watchlist_channel.id
         }
-        db.watchlist.insert_one(watchlist_doc)
+        await db.watchlist.insert_one(watchlist_doc)
         self.watchlist_data[member.guild.id][member.id] = watchlist_doc
         return watchlist_doc
 
@@ -77,29 +87,114 @@ class Watchlist:
         if channel:
             await channel.delete()
 
-        db.watchlist.delete_one({'guild_id': member.guild.id, 'user_id': member.id})
+        await db.watchlist.delete_one({'guild_id': member.guild.id, 'user_id': member.id})
+        self.watchlist_data[member.guild.id].pop(member.id, None)
 
-    def add_filters(self, member: discord.Member, filters: list):
+    async def add_filters(self, member: discord.Member, filters: list):
         """Add filters to a watchlist member."""
         watchlist_member = self.get_member(member)
         all_filters = watchlist_member['filters']
         if all_filters:
             filters += all_filters
 
-        db.watchlist.update_one({'guild_id': member.guild.id, 'user_id': member.id}, {'$set': {f'filters': filters}})
-
-    async def send_message(self, channel: discord.TextChannel, message: discord.Message):
-        """Send watchlist message with a webhook."""
-        embeds = [discord.Embed(description=f'{message.content}\n{message.channel.mention} [link]({message.jump_url})', timestamp=datetime.datetime.now())]
-        files = [await attachment.to_file() for attachment in message.attachments]
-        await self.bot.webhooks.send(
-            channel=channel,
-            content='',
-            username=message.author.name,
-            avatar_url=message.author.avatar_url,
-            files=files,
-            embeds=embeds
-        )
+        await db.watchlist.update_one({'guild_id': member.guild.id, 'user_id': member.id}, {'$set': {f'filters': filters}})
+
+    def queue_message(self, channel: discord.TextChannel, message: discord.Message):
+        """Queue message to be forwarded to a watchlist channel, starting a task to forward the channel's messages if needed."""
+        self.queues.setdefault(channel.id, []).append(message)
+        if channel.id not in self.senders:
+            self.senders[channel.id] = asyncio.create_task(self.forward_messages(channel))
+
+    async def forward_messages(self, channel: discord.TextChannel):
+        """Forward queued messages to a watchlist channel, messages queued while sending are sent together in the next batch."""
+        try:
+            while self.queues.get(channel.id):
+                messages = self.queues.pop(channel.id)
+                try:
+                    await self.send_messages(channel, messages)
+                except Exception as e:
+                    self.bot.logger.exception(f'Failed to forward watchlist messages to channel {channel.id}: {e}')
+        finally:
+            self.senders.pop(channel.id, None)
+
+    async def send_messages(self, channel: discord.TextChannel, messages: list[discord.Message]):
+        """
+        Send watchlist messages with as few webhook messages as possible.
+
+        Attachments are downloaded concurrently, attachments which fail to download or don't fit in a single webhook
+        message with the message's other attachments are linked instead. A batch which fails to send is logged
+        and skipped, so the batches after it are still sent.
+
+        Parameters
+        ----------------
+        channel: :class:`discord.TextChannel`
+            The watchlist channel.
+        messages: List[:class:`discord.Message`]
+            The messages, in the order they were sent.
+        """
+        size_limit = channel.guild.filesize_limit
+        attachments = []
+        for message in messages:
+            # a message's files need to fit in one webhook message, the rest are linked
+            message_attachments = []
+            message_size = 0
+            for attachment in message.attachments:
+                if len(message_attachments) < 10 and message_size + attachment.size <= size_limit:
+                    message_attachments.append(attachment)
+                    message_size += attachment.size
+
+            attachments += message_attachments
+
+        downloaded = await asyncio.gather(*[a.to_file() for a in attachments], return_exceptions=True)
+        files = {a.id: file for a, file in zip(attachments, downloaded) if not isinstance(file, Exception)}
+
+        author = None
+        batch_embeds = []
+        batch_files = []
+        batch_size = 0
+        for message in messages:
+            message_files = [files[a.id] for a in message.attachments if a.id in files]
+            message_size = sum(a.size for a in message.attachments if a.id in files)
+
+            description = f'{message.content}\n{message.channel.mention} [link]({message.jump_url})'
+            links = [f'[{a.filename}]({a.url})' for a in message.attachments if a.id not in files]
+            if links:
+                description += '\n' + '\n'.join(links)
+            embed = discord.Embed(description=description, timestamp=message.created_at)
+
+            # webhook messages can have up to 10 embeds and files and files need to fit in the upload limit
+            message_author = (message.author.name, str(message.author.avatar_url))
+            if batch_embeds and (
+                    message_author != author
+                    or len(batch_embeds) == 10
+                    or len(batch_files) + len(message_files) > 10
+                    or batch_size + message_size > size_limit
+            ):
+                await self.send_message(channel, author, batch_embeds, batch_files)
+                batch_embeds, batch_files, batch_size = [], [], 0
+
+            author = message_author
+            batch_embeds.append(embed)
+            batch_files += message_files
+            batch_size += message_size
+
+        if batch_embeds:
+            await self.send_message(channel, author, batch_embeds, batch_files)
+
+    async def send_message(self, channel: discord.TextChannel, author: tuple, embeds: list[discord.Embed], files: list[discord.File]):
+        """Send watchlist messages with a webhook, failures are logged instead of raised."""
+        username, avatar_url = author
+        try:
+            await self.bot.webhooks.send(
+                channel=channel,
+                content='',
+                username=username,
+                avatar_url=avatar_url,
+                files=files,
+                embeds=embeds
+            )
+        except Exception as e:
+            self.bot.logger.exception(f'Failed to send {len(embeds)} watchlist messages to channel {channel.id}: {e}')
 
     async def on_message(self, message: discord.Message):
         """Function run on every message to check if user is on watchlist and send their message."""
@@ -109,16 +204,19 @@ class Watchlist:
         if not message.guild:
             return
 
-        guild_watchlist_data = self.watchlist_data[message.guild.id]
-        user_watchlist_data = guild_watchlist_data[message.author.id] if message.author.id in guild_watchlist_data else None
+        user_watchlist_data = self.watchlist_data.get(message.guild.id, {}).get(message.author.id)
+        if not user_watchlist_data:
+            return
+
         watchlist_category = await self.get_watchlist_category(message.guild)
-        if not user_watchlist_data or not watchlist_category:
+        if not watchlist_category:
             return
 
         channel_id = user_watchlist_data["channel_id"]
         channel = self.bot.get_channel(int(channel_id))
         if channel:
-            await self.send_message(channel, message)
+            self.queue_message(channel, message)
         else:
             # remove from watchlist, since watchlist channel doesnt exist
-            db.watchlist.delete_one({"guild_id": message.guild.id, "user_id": message.author.id})
+            self.watchlist_data[message.guild.id].pop(message.author.id, None)
+            await db.watchlist.delete_one({"guild_id": message.guild.id, "user_id": message.author.id})
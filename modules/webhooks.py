@@ -5,7 +5,7 @@ from modules import database
 from discord import Webhook, AsyncWebhookAdapter
 from typing import Optional
 
-db = database.get_connection()
+db = database.get_async_connection()
 
 
 class Webhooks:
@@ -20,7 +20,7 @@ class Webhooks:
     async def initialize(self):
         """Cache all the existing webhooks."""
         webhooks = db.webhooks.find({})
-        for webhook in webhooks:
+        async for webhook in webhooks:
             partial_webhook = Webhook.from_url(webhook['url'], adapter=AsyncWebhookAdapter(self.bot._connection.http._HTTPClient__session))
             self.webhooks[webhook['channel_id']] = partial_webhook
 
@@ -37,7 +37,7 @@ class Webhooks:
             webhook = await channel.create_webhook(name='TLDR-Bot-webhook')
 
         self.webhooks[channel.id] = webhook
-        db.webhooks.insert_one({'channel_id': channel.id, 'url': webhook.url})
+        await db.webhooks.insert_one({'channel_id': channel.id, 'url': webhook.url})
         return webhook
 
     async def get_webhook(self, channel: discord.TextChannel) -> Optional[discord.Webhook]: